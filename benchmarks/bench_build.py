@@ -0,0 +1,159 @@
+"""Time complete builds of a synthetic wiki (see generate.py), reporting the time
+taken by each phase, pages per second and peak memory use, e.g.:
+
+    $ python benchmarks/bench_build.py --pages 5000 --namespaces 4 --repeat 3 --output=base.json
+
+Use the same arguments to compare the results of different commits. If no
+directory is given the wiki is generated in a temporary directory.
+"""
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import statistics
+import tempfile
+from pathlib import Path
+from collections import defaultdict
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from mokuwiki.wiki import Wiki
+from mokuwiki.profiler import PHASES
+
+from generate import WikiSpec, add_spec_arguments, make_wiki, spec_from_args
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows
+    resource = None
+
+
+def peak_rss() -> int | None:
+    """Return the peak resident set size of this process in bytes, if known."""
+
+    if not resource:
+        return None
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # kilobytes on Linux, bytes on macOS
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def run_build(config_file: Path) -> dict:
+    """Build the wiki once, returning the total time and the time of each phase
+    (summed over all namespaces).
+    """
+    start = time.perf_counter()
+
+    wiki = Wiki(str(config_file), profile=True)
+    wiki.process_wiki()
+
+    total = time.perf_counter() - start
+
+    phases = defaultdict(float)
+
+    for namespace_phases in wiki.profiler.report()['phases'].values():
+        for phase, totals in namespace_phases.items():
+            phases[phase] += totals['wall']
+
+    pages = sum(len(ns) for ns in wiki.namespaces.values())
+
+    return {'total': total, 'pages': pages, 'phases': dict(phases)}
+
+
+def run_benchmark(root: Path, spec: WikiSpec, repeat: int) -> dict:
+
+    config_file = make_wiki(root, spec)
+
+    runs = []
+
+    for _ in range(repeat):
+        shutil.rmtree(root / 'build', ignore_errors=True)
+        runs.append(run_build(config_file))
+
+    totals = [r['total'] for r in runs]
+    pages = runs[0]['pages']
+
+    phases = {}
+
+    for phase in sorted({p for r in runs for p in r['phases']}, key=lambda p: PHASES.index(p) if p in PHASES else len(PHASES)):
+        phases[phase] = statistics.median(r['phases'].get(phase, 0.0) for r in runs)
+
+    return {
+        'spec': spec.as_dict(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'repeat': repeat,
+        'pages': pages,
+        'total': {'min': min(totals), 'median': statistics.median(totals), 'max': max(totals)},
+        'pages_per_second': pages / statistics.median(totals) if pages else 0.0,
+        'phases': phases,
+        'peak_rss': peak_rss()
+    }
+
+
+def print_results(results: dict, baseline: dict | None = None) -> None:
+
+    def change(new: float, old: float | None) -> str:
+        if not old:
+            return ''
+        return f" ({(new - old) / old:+.1%})"
+
+    old_phases = baseline['phases'] if baseline else {}
+
+    print(f"pages: {results['pages']}, builds: {results['repeat']}")
+    print(f"total (median): {results['total']['median']:.3f}s"
+          f"{change(results['total']['median'], baseline and baseline['total']['median'])}")
+    print(f"pages/sec: {results['pages_per_second']:.1f}"
+          f"{change(results['pages_per_second'], baseline and baseline['pages_per_second'])}")
+
+    if results['peak_rss']:
+        print(f"peak RSS: {results['peak_rss'] / (1 << 20):.1f} MB"
+              f"{change(results['peak_rss'], baseline and baseline['peak_rss'])}")
+
+    print()
+
+    for phase, wall in results['phases'].items():
+        print(f"{phase:<12} {wall:>10.3f}s{change(wall, old_phases.get(phase))}")
+
+
+def main(args=None):
+    if args is None:
+        args = sys.argv[1:]
+
+    parser = argparse.ArgumentParser(description='Benchmark complete builds of a synthetic wiki')
+    parser.add_argument('--dir', help='Directory for the synthetic wiki (default is a temporary directory)')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of builds to time')
+    parser.add_argument('--output', help='Save the results to a JSON file')
+    parser.add_argument('--compare', help='Compare the results with a previously saved JSON file')
+    add_spec_arguments(parser)
+
+    args = parser.parse_args(args)
+
+    spec = spec_from_args(args)
+
+    if args.dir:
+        results = run_benchmark(Path(args.dir), spec, max(1, args.repeat))
+    else:
+        with tempfile.TemporaryDirectory(prefix='mokuwiki-bench-') as root:
+            results = run_benchmark(Path(root), spec, max(1, args.repeat))
+
+    baseline = None
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf8') as bf:
+            baseline = json.load(bf)
+
+    print_results(results, baseline)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf8') as of:
+            json.dump(results, of, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+"""Micro-benchmarks of the helper functions and directive handlers that are
+called for every page (or every directive), using timeit, e.g.:
+
+    $ python benchmarks/bench_micro.py --output=before.json
+    $ # make some changes
+    $ python benchmarks/bench_micro.py --compare=before.json
+
+Each result is the best time per call over a number of repeats. Use --filter to
+only run the benchmarks whose names contain a string, e.g. --filter=page.
+"""
+import re
+import sys
+import json
+import timeit
+import argparse
+import platform
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from mokuwiki.wiki import Wiki
+from mokuwiki.page import MetadataReplace
+from mokuwiki.page import FILE_INCLUDE_RE, EXEC_COMMAND_RE, TAGS_REPLACE_RE, PAGE_LINK_RE, IMAGE_LINK_RE, CUSTOM_STYLE_RE
+from mokuwiki.utils import make_file_name, make_markdown_link, make_wiki_link, make_image_link, make_markdown_span
+from mokuwiki.utils import FileIncludeParser, TagListParser
+
+from generate import WikiSpec, make_wiki
+
+META = {'title': 'Page 0-1', 'tags': ['tag1', 'tag2'], 'summary': 'A dragon in the castle',
+        'level': 3, 'monster': {'type': 'undead', 'rank': 2}}
+
+TEMPLATE = "**?{title}** (level ?{level}): ?{summary}. Type ?{monster}, missing ?{missing}.\n" * 4
+
+
+def match(pattern: str, text: str) -> re.Match:
+    return re.search(pattern, text)
+
+
+def utility_benchmarks() -> dict:
+
+    include_parser = FileIncludeParser()
+    tags_parser = TagListParser()
+
+    return {
+        'make_file_name': lambda: make_file_name("The Dragon's Lair (Part 2)", 'md'),
+        'make_markdown_link': lambda: make_markdown_link('The Dragon', 'The Dragon', 'monsters'),
+        'make_wiki_link': lambda: make_wiki_link('The Dragon', 'ns1', 'Dragons'),
+        'make_image_link': lambda: make_image_link('dragon', 'A red dragon', media_dir='images'),
+        'make_markdown_span': lambda: make_markdown_span('Smallcaps text', '.smallcaps'),
+        'MetadataReplace.safe_substitute': lambda: MetadataReplace(TEMPLATE).safe_substitute(META),
+        'FileIncludeParser.parse': lambda: include_parser.parse('monsters/*.md --sort --sep=--- --indent=> --shift=1'),
+        'TagListParser.parse': lambda: tags_parser.parse('tag1 &tag2 !tag3 --format=list --sort-by=level --reverse'),
+    }
+
+
+def page_benchmarks(root: Path) -> dict:
+
+    config_file = make_wiki(root, WikiSpec(pages=200, namespaces=2, include_files=5))
+
+    wiki = Wiki(str(config_file))
+
+    for namespace in wiki.namespaces.values():
+        namespace.preprocess_pages()
+        namespace.load_pages()
+
+    namespace = wiki.namespaces['ns0']
+    page = namespace.get_page('Page 0-1')
+
+    text = ("<<inc/part_1.md>> %% echo benchmark %% {{tag1 &tag2}} {{#level>10}} "
+            "[[Page 0-2]] [[ns1:Page 1-3|Page Three]] [[Missing Page]] !!dragon|A dragon!! ^^small caps^^")
+
+    include = match(FILE_INCLUDE_RE, text)
+    command = match(EXEC_COMMAND_RE, text)
+    tags, tag_query = re.finditer(TAGS_REPLACE_RE, text)
+    link, ns_link, broken_link = re.finditer(PAGE_LINK_RE, text)
+    image = match(IMAGE_LINK_RE, text)
+    custom = match(CUSTOM_STYLE_RE, text)
+
+    def uncached(tag_match):
+        namespace.tags_cache.clear()
+        return page.process_tags_directive(tag_match)
+
+    body = page.body
+
+    def process_directives():
+        page.body = body
+        namespace.tags_cache.clear()
+        page.process_directives()
+
+    return {
+        'Page.process_file_includes': lambda: page.process_file_includes(include),
+        'Page.process_exec_command (cached)': lambda: page.process_exec_command(command),
+        'Page.process_tags_directive': lambda: uncached(tags),
+        'Page.process_tags_directive (cached)': lambda: page.process_tags_directive(tags),
+        'Page.process_tags_directive (query)': lambda: uncached(tag_query),
+        'Page.process_link_directives': lambda: page.process_link_directives(link),
+        'Page.process_link_directives (namespace)': lambda: page.process_link_directives(ns_link),
+        'Page.process_link_directives (broken)': lambda: page.process_link_directives(broken_link),
+        'Page.process_image_links': lambda: page.process_image_links(image),
+        'Page.process_custom_style': lambda: page.process_custom_style(custom),
+        'Page.process_directives': process_directives,
+        'Page.content': lambda: page.content(),
+    }
+
+
+def run_benchmarks(benchmarks: dict, repeat: int, name_filter: str = '') -> dict:
+    """Return the best time per call (in seconds) of each benchmark."""
+
+    results = {}
+
+    for name, function in benchmarks.items():
+        if name_filter and name_filter.lower() not in name.lower():
+            continue
+
+        timer = timeit.Timer(function)
+
+        # run enough times for each repeat to take at least 0.2s
+        number, _ = timer.autorange()
+
+        results[name] = min(timer.repeat(repeat=repeat, number=number)) / number
+
+    return results
+
+
+def format_time(seconds: float) -> str:
+
+    for unit, scale in [('s', 1), ('ms', 1e-3), ('us', 1e-6)]:
+        if seconds >= scale:
+            return f"{seconds / scale:.2f} {unit}"
+
+    return f"{seconds / 1e-9:.0f} ns"
+
+
+def main(args=None):
+    if args is None:
+        args = sys.argv[1:]
+
+    parser = argparse.ArgumentParser(description='Micro-benchmarks of helper functions and directive handlers')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of times to repeat each benchmark')
+    parser.add_argument('--filter', default='', help='Only run benchmarks whose names contain this string')
+    parser.add_argument('--output', help='Save the results to a JSON file')
+    parser.add_argument('--compare', help='Compare the results with a previously saved JSON file')
+
+    args = parser.parse_args(args)
+
+    baseline = {}
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf8') as bf:
+            baseline = json.load(bf)['results']
+
+    with tempfile.TemporaryDirectory(prefix='mokuwiki-bench-') as root:
+        benchmarks = utility_benchmarks()
+        benchmarks.update(page_benchmarks(Path(root)))
+
+        results = run_benchmarks(benchmarks, max(1, args.repeat), args.filter)
+
+    for name, seconds in results.items():
+        line = f"{name:<45} {format_time(seconds):>12}"
+
+        if baseline.get(name):
+            line += f"  ({(seconds - baseline[name]) / baseline[name]:+.1%})"
+
+        print(line)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf8') as of:
+            json.dump({'python': platform.python_version(), 'platform': platform.platform(), 'results': results}, of, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+"""Generate a synthetic wiki for benchmarking. Run as a script to create a
+wiki that can be built with the mokuwiki command, e.g.:
+
+    $ python benchmarks/generate.py /tmp/bench --pages 2000 --namespaces 4
+    $ mokuwiki /tmp/bench/wiki.yaml --profile=/tmp/bench/profile.json
+
+The same arguments and seed always produce the same wiki.
+"""
+import sys
+import random
+import argparse
+from pathlib import Path
+
+import yaml
+
+WORDS = ['monster', 'dragon', 'castle', 'river', 'sword', 'shield', 'forest', 'tower',
+         'wizard', 'knight', 'potion', 'scroll', 'temple', 'cavern', 'goblin', 'armour',
+         'the', 'a', 'of', 'and', 'in', 'with', 'from', 'under']
+
+
+class WikiSpec:
+    """The size and shape of a synthetic wiki."""
+
+    def __init__(self, pages: int = 500, namespaces: int = 2, links: int = 5, tags: int = 50,
+                 tags_per_page: int = 3, tag_directives: float = 0.1, includes: int = 1,
+                 include_files: int = 20, story_length: int = 10, paragraphs: int = 5,
+                 seed: int = 1) -> None:
+        """Initialize a WikiSpec instance.
+
+        Args:
+            pages (int, optional): Total number of pages, split between namespaces. Defaults to 500.
+            namespaces (int, optional): Number of namespaces. Defaults to 2.
+            links (int, optional): Page links per page. Defaults to 5.
+            tags (int, optional): Number of distinct tags. Defaults to 50.
+            tags_per_page (int, optional): Tags on each page. Defaults to 3.
+            tag_directives (float, optional): Chance of a page having a tag directive. Defaults to 0.1.
+            includes (int, optional): Include directives per page. Defaults to 1.
+            include_files (int, optional): Number of files that can be included, per namespace. Defaults to 20.
+            story_length (int, optional): Pages per story, 0 for no stories. Defaults to 10.
+            paragraphs (int, optional): Paragraphs of text per page. Defaults to 5.
+            seed (int, optional): Seed for the random number generator. Defaults to 1.
+        """
+        self.pages = pages
+        self.namespaces = max(1, namespaces)
+        self.links = links
+        self.tags = max(1, tags)
+        self.tags_per_page = min(tags_per_page, self.tags)
+        self.tag_directives = tag_directives
+        self.includes = includes
+        self.include_files = include_files
+        self.story_length = story_length
+        self.paragraphs = paragraphs
+        self.seed = seed
+
+    def as_dict(self) -> dict:
+        return dict(vars(self))
+
+
+def page_title(ns: int, page: int) -> str:
+    return f"Page {ns}-{page}"
+
+
+def make_text(rand: random.Random, words: int) -> str:
+    return ' '.join(rand.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+
+def make_page(rand: random.Random, spec: WikiSpec, ns: int, page: int, ns_pages: int) -> str:
+    meta = {
+        'title': page_title(ns, page),
+        'tags': rand.sample([f"tag{t}" for t in range(spec.tags)], spec.tags_per_page),
+        'summary': make_text(rand, 8),
+        'level': rand.randint(1, 20)
+    }
+
+    # every story_length pages form a story, linked by 'next'
+    if spec.story_length > 1:
+        if page % spec.story_length == 0:
+            meta['home'] = True
+
+        if (page + 1) % spec.story_length != 0 and page + 1 < ns_pages:
+            meta['next'] = page_title(ns, page + 1)
+
+    paragraphs = [make_text(rand, rand.randint(30, 80)) for _ in range(spec.paragraphs)]
+
+    for _ in range(spec.links):
+        other_ns = rand.randrange(spec.namespaces)
+        link = page_title(other_ns, rand.randrange(ns_pages))
+
+        # a few links are broken
+        if rand.random() < 0.05:
+            link = f"Missing {link}"
+
+        if other_ns != ns:
+            link = f"ns{other_ns}:{link}"
+
+        paragraphs.insert(rand.randrange(len(paragraphs) + 1), f"See [[{link}]].")
+
+    for _ in range(spec.includes if spec.include_files else 0):
+        paragraphs.insert(rand.randrange(len(paragraphs) + 1), f"<<inc/part_{rand.randrange(spec.include_files)}.md>>")
+
+    if rand.random() < spec.tag_directives:
+        paragraphs.append(f"{{{{tag{rand.randrange(spec.tags)}}}}}")
+
+    return '---\n' + yaml.safe_dump(meta, default_flow_style=False) + '...\n' + '\n\n'.join(paragraphs) + '\n'
+
+
+def make_wiki(root: Path | str, spec: WikiSpec) -> Path:
+    """Write a synthetic wiki to a directory, returning the path of its config file.
+    Pages are in root/source/ns<n>, output goes to root/build.
+    """
+    root = Path(root)
+    rand = random.Random(spec.seed)
+
+    ns_pages = max(1, spec.pages // spec.namespaces)
+
+    namespaces = {}
+
+    for ns in range(spec.namespaces):
+        content = root / 'source' / f"ns{ns}"
+        (content / 'inc').mkdir(parents=True, exist_ok=True)
+
+        for page in range(ns_pages):
+            with (content / f"page_{page}.md").open('w', encoding='utf8') as pf:
+                pf.write(make_page(rand, spec, ns, page, ns_pages))
+
+        for part in range(spec.include_files):
+            with (content / 'inc' / f"part_{part}.md").open('w', encoding='utf8') as pf:
+                pf.write(make_text(rand, 40) + '\n')
+
+        namespaces[f"ns{ns}"] = {
+            'content': str(content),
+            'search_fields': ['title', 'tags', 'summary'],
+            'toc': 1 if spec.story_length > 1 else 0
+        }
+
+        if ns == 0:
+            namespaces['ns0']['is_root'] = True
+
+    config = {'name': 'benchmark', 'build_dir': str(root / 'build'), 'verbose': 0, 'namespaces': namespaces}
+
+    config_file = root / 'wiki.yaml'
+
+    with config_file.open('w', encoding='utf8') as cf:
+        yaml.safe_dump(config, cf, default_flow_style=False)
+
+    return config_file
+
+
+def add_spec_arguments(parser: argparse.ArgumentParser) -> None:
+
+    defaults = WikiSpec()
+
+    parser.add_argument('--pages', type=int, default=defaults.pages, help='Total number of pages')
+    parser.add_argument('--namespaces', type=int, default=defaults.namespaces, help='Number of namespaces')
+    parser.add_argument('--links', type=int, default=defaults.links, help='Page links per page')
+    parser.add_argument('--tags', type=int, default=defaults.tags, help='Number of distinct tags')
+    parser.add_argument('--tags-per-page', type=int, default=defaults.tags_per_page, help='Tags on each page')
+    parser.add_argument('--tag-directives', type=float, default=defaults.tag_directives, help='Chance of a page having a tag directive')
+    parser.add_argument('--includes', type=int, default=defaults.includes, help='Include directives per page')
+    parser.add_argument('--include-files', type=int, default=defaults.include_files, help='Files that can be included, per namespace')
+    parser.add_argument('--story-length', type=int, default=defaults.story_length, help='Pages per story, 0 for none')
+    parser.add_argument('--paragraphs', type=int, default=defaults.paragraphs, help='Paragraphs of text per page')
+    parser.add_argument('--seed', type=int, default=defaults.seed, help='Random seed')
+
+
+def spec_from_args(args: argparse.Namespace) -> WikiSpec:
+    return WikiSpec(args.pages, args.namespaces, args.links, args.tags, args.tags_per_page,
+                    args.tag_directives, args.includes, args.include_files, args.story_length,
+                    args.paragraphs, args.seed)
+
+
+def main(args=None):
+    if args is None:
+        args = sys.argv[1:]
+
+    parser = argparse.ArgumentParser(description='Generate a synthetic wiki for benchmarking')
+    parser.add_argument('root', help='Directory for the wiki')
+    add_spec_arguments(parser)
+
+    args = parser.parse_args(args)
+
+    print(make_wiki(args.root, spec_from_args(args)))
+
+
+if __name__ == '__main__':
+    main()
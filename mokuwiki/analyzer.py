@@ -0,0 +1,90 @@
+"""Text analysis for the search index. An analyzer turns a string into a list of
+index terms using a pipeline of (optional) Unicode folding, tokenizing, noise
+word removal and stemming.
+"""
+import re
+import logging
+import unicodedata
+
+from mokuwiki.stemmer import PorterStemmer
+
+DEFAULT_TOKENIZER = 'default'
+
+# named tokenizers, anything else is assumed to be a regular expression for re.findall()
+TOKENIZERS = {
+    'default': None,
+    'words': r"\w+",
+    'alnum': r"[a-z0-9]+"
+}
+
+STEMMERS = {
+    'porter': PorterStemmer
+}
+
+
+class Analyzer:
+    """Convert text into search terms.
+
+    The 'default' tokenizer reproduces the original behaviour, i.e. all
+    characters that are not ASCII letters, digits or spaces are removed and the
+    remaining text is split on whitespace.
+    """
+
+    def __init__(self, tokenizer: str = DEFAULT_TOKENIZER, folding: bool = False, stemmer: str | None = None, stopwords: list[str] | None = None) -> None:
+        """Initialize an Analyzer instance.
+
+        Args:
+            tokenizer (str, optional): A tokenizer name or a regular expression. Defaults to 'default'.
+            folding (bool, optional): Remove accents etc, so 'café' becomes 'cafe'. Defaults to False.
+            stemmer (str, optional): Name of the stemmer to use, if any. Defaults to None.
+            stopwords (list, optional): Words that are not indexed. Defaults to None.
+        """
+        tokenizer = tokenizer or DEFAULT_TOKENIZER
+
+        pattern = TOKENIZERS.get(tokenizer, tokenizer)
+
+        try:
+            self._tokenizer = re.compile(pattern) if pattern else None
+        except re.error:
+            logging.warning(f"invalid search tokenizer '{tokenizer}', using '{DEFAULT_TOKENIZER}'")
+            self._tokenizer = None
+
+        self._folding = folding
+
+        self._stemmer = None
+
+        if stemmer:
+            if stemmer in STEMMERS:
+                self._stemmer = STEMMERS[stemmer]()
+            else:
+                logging.warning(f"unknown search stemmer '{stemmer}', terms will not be stemmed")
+
+        # set membership is much quicker than searching a list
+        self.stopwords = frozenset(w.strip().lower() for w in stopwords or [] if w and w.strip())
+
+    def tokenize(self, text: str) -> list[str]:
+
+        if self._folding:
+            text = fold(text)
+
+        text = text.lower()
+
+        if not self._tokenizer:
+            return re.sub('[^a-z0-9 ]', '', text).split()
+
+        return self._tokenizer.findall(text)
+
+    def analyze(self, text: str) -> list[str]:
+        """Return the list of terms in the text. Terms may be repeated.
+        """
+        terms = [term for term in self.tokenize(text) if term not in self.stopwords]
+
+        if self._stemmer:
+            terms = [self._stemmer.stem(term) for term in terms]
+
+        return terms
+
+
+def fold(text: str) -> str:
+    """Remove diacritics and compatibility characters from a string."""
+    return ''.join(c for c in unicodedata.normalize('NFKD', text) if not unicodedata.combining(c))
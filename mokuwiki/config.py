@@ -6,6 +6,8 @@ from pathlib import Path
 from string import Template
 from typing import TYPE_CHECKING
 
+from mokuwiki.utils import YAML_LOADERS, load_yaml
+
 
 if TYPE_CHECKING:
     from mokuwiki.wiki import Wiki
@@ -31,6 +33,25 @@ DEFAULT_META_LINKS_BROKEN = False
 DEFAULT_SEARCH_FIELDS = ['title', 'alias', 'tags', 'summary', 'keywords']
 DEFAULT_SEARCH_PREFIX = ''
 DEFAULT_SEARCH_FILE = '_index.json'
+DEFAULT_SEARCH_MERGED_FILE = ''
+DEFAULT_SEARCH_TOKENIZER = 'default'
+DEFAULT_SEARCH_FOLDING = False
+DEFAULT_SEARCH_STEMMER = None
+DEFAULT_META_INDEXES = []
+DEFAULT_EXEC_CACHE = 'build'
+DEFAULT_EXEC_CACHE_TTL = 0
+DEFAULT_EXEC_CACHE_DIR = '_cache/exec'
+DEFAULT_EXEC_WORKERS = 1
+DEFAULT_EXEC_TIMEOUT = 0
+DEFAULT_STREAM = False
+DEFAULT_MMAP_THRESHOLD = 1 << 20
+DEFAULT_YAML_LOADER = 'fast'
+DEFAULT_IO_WORKERS = 0
+DEFAULT_CONTENT_INCLUDE = ['*.md']
+DEFAULT_CONTENT_EXCLUDE = []
+DEFAULT_INCREMENTAL = False
+DEFAULT_RENDER_CACHE_DIR = ''
+DEFAULT_NAMESPACE_WORKERS = 0
 
 DEFAULT_NOISE_WORDS = ['a', 'an', 'and', 'are', 'as', 'at', 'be', 'but', 'by', 'for',
                        'if', 'i', 'in', 'into', 'is', 'it', 'no', 'not', 'of', 'on',
@@ -47,7 +68,7 @@ class WikiConfig:
         elif isinstance(config, str):
             with Path(config).open('r') as cf:
                 try:
-                    self.config = yaml.safe_load(cf)
+                    self.config = load_yaml(cf.read(), 'c')
                 except yaml.YAMLError:
                     # might occur for duplicated namespace names
                     raise ValueError(f"Error reading config file {config}")
@@ -135,7 +156,58 @@ class WikiConfig:
     @property
     def search_file(self) -> str:
         return self.config.get('search_file', DEFAULT_SEARCH_FILE)
+
+    @property
+    def search_merged_file(self) -> str:
+        """The name of the wiki-wide search index, in the root namespace's target dir.
+        If blank (the default) then no merged index is created.
+        """
+        return self.config.get('search_merged_file', DEFAULT_SEARCH_MERGED_FILE)
+
+    @property
+    def search_tokenizer(self) -> str:
+        return self.config.get('search_tokenizer', DEFAULT_SEARCH_TOKENIZER)
+
+    @property
+    def search_folding(self) -> bool:
+        return self.config.get('search_folding', DEFAULT_SEARCH_FOLDING)
+
+    @property
+    def search_stemmer(self) -> str | None:
+        return self.config.get('search_stemmer', DEFAULT_SEARCH_STEMMER)
     
+    @property
+    def exec_cache(self) -> str:
+        return self.config.get('exec_cache', DEFAULT_EXEC_CACHE)
+
+    @property
+    def exec_cache_ttl(self) -> float:
+        return self.config.get('exec_cache_ttl', DEFAULT_EXEC_CACHE_TTL)
+
+    @property
+    def exec_cache_dir(self) -> Path:
+        """Where persistent exec outputs are kept, by default in the build dir.
+        """
+        return Path(self.config.get('exec_cache_dir', self.build_dir / DEFAULT_EXEC_CACHE_DIR)).expanduser()
+
+    @property
+    def exec_workers(self) -> int:
+        """The number of exec commands to run at once. If more than one then all
+        commands are found and run before any pages are processed.
+        """
+        return max(1, int(self.config.get('exec_workers', DEFAULT_EXEC_WORKERS)))
+
+    @property
+    def exec_timeout(self) -> float:
+        return self.config.get('exec_timeout', DEFAULT_EXEC_TIMEOUT)
+
+    @property
+    def exec_callables(self) -> dict[str, str]:
+        """Python functions for 'py:' exec directives, as a map of names to
+        'module:function' strings.
+        """
+        return self.config.get('exec_callables', {})
+
     @property
     def preprocessing(self) -> str:
         # default pre-processing is null
@@ -157,6 +229,49 @@ class WikiConfig:
     @property
     def meta_links_broken(self) -> bool:
         return self.config.get('meta_links_broken', DEFAULT_META_LINKS_BROKEN)
+
+    @property
+    def meta_indexes(self) -> list[str]:
+        return self.config.get('meta_indexes', DEFAULT_META_INDEXES)
+
+    @property
+    def stream(self) -> bool:
+        return self.config.get('stream', DEFAULT_STREAM)
+
+    @property
+    def mmap_threshold(self) -> int:
+        return int(self.config.get('mmap_threshold', DEFAULT_MMAP_THRESHOLD))
+
+    @property
+    def yaml_loader(self) -> str:
+        loader = self.config.get('yaml_loader', DEFAULT_YAML_LOADER)
+
+        if loader not in YAML_LOADERS:
+            logging.warning(f"unknown yaml_loader '{loader}', using '{DEFAULT_YAML_LOADER}'")
+            loader = DEFAULT_YAML_LOADER
+
+        return loader
+
+    @property
+    def io_workers(self) -> int:
+        return int(self.config.get('io_workers', DEFAULT_IO_WORKERS))
+
+    @property
+    def incremental(self) -> bool:
+        return self.config.get('incremental', DEFAULT_INCREMENTAL)
+
+    @property
+    def render_cache_dir(self) -> Path | None:
+        render_cache_dir = self.config.get('render_cache_dir', DEFAULT_RENDER_CACHE_DIR)
+
+        return Path(render_cache_dir).expanduser() if render_cache_dir else None
+
+    @property
+    def namespace_workers(self) -> int:
+        """The number of processes used to load and render namespaces at once.
+        If 0 or 1 then namespaces are processed one at a time.
+        """
+        return int(self.config.get('namespace_workers', DEFAULT_NAMESPACE_WORKERS))
     
     @property
     def noise_words(self) -> list[str]:
@@ -240,6 +355,24 @@ class NamespaceConfig:
             return [Path(Template(c).substitute(self.asdict())) for c in content]
         
         logging.error(f"No content defined for namespace {self.name}")
+
+    @property
+    def content_include(self) -> list[str]:
+        """Patterns of the page files in the content dirs, relative to each
+        content dir. A '**' matches any number of sub-directories, e.g. '**/*.md'.
+        """
+        include = self.config.get('content_include', DEFAULT_CONTENT_INCLUDE)
+
+        return [include] if isinstance(include, str) else include
+
+    @property
+    def content_exclude(self) -> list[str]:
+        """Patterns of files and sub-directories in the content dirs that are not
+        pages. Excluded sub-directories are not searched.
+        """
+        exclude = self.config.get('content_exclude', DEFAULT_CONTENT_EXCLUDE)
+
+        return [exclude] if isinstance(exclude, str) else exclude
     
     @property
     def media_dir(self) -> str:
@@ -285,6 +418,18 @@ class NamespaceConfig:
     @property
     def search_file(self) -> str:
         return self.config.get('search_file', self.wiki_config.search_file)
+
+    @property
+    def search_tokenizer(self) -> str:
+        return self.config.get('search_tokenizer', self.wiki_config.search_tokenizer)
+
+    @property
+    def search_folding(self) -> bool:
+        return self.config.get('search_folding', self.wiki_config.search_folding)
+
+    @property
+    def search_stemmer(self) -> str | None:
+        return self.config.get('search_stemmer', self.wiki_config.search_stemmer)
     
     @property
     def templates(self) -> dict:
@@ -304,6 +449,48 @@ class NamespaceConfig:
     @property
     def meta_links_broken(self) -> bool:
         return self.config.get('meta_links_broken', self.wiki_config.meta_links_broken)
+
+    @property
+    def meta_indexes(self) -> list[str]:
+        """Metadata fields that are indexed as pages are loaded, for use in tag
+        query comparisons and the '--sort-by' option. Other fields are indexed
+        when first used.
+        """
+        return self.config.get('meta_indexes', self.wiki_config.meta_indexes)
+
+    @property
+    def stream(self) -> bool:
+        """Keep only the metadata used by the index once a page has been saved.
+        Other fields are read from the page's file again if needed.
+        """
+        return self.config.get('stream', self.wiki_config.stream)
+
+    @property
+    def mmap_threshold(self) -> int:
+        """Pages larger than this (in bytes) are read using a memory map, and
+        only the lines that contain directives are decoded and processed. If
+        0 then memory maps are not used.
+        """
+        return int(self.config.get('mmap_threshold', self.wiki_config.mmap_threshold))
+
+    @property
+    def yaml_loader(self) -> str:
+        """How page metadata is loaded, one of 'fast', 'c' or 'python', see load_yaml().
+        """
+        loader = self.config.get('yaml_loader', self.wiki_config.yaml_loader)
+
+        if loader not in YAML_LOADERS:
+            logging.warning(f"unknown yaml_loader '{loader}', using '{DEFAULT_YAML_LOADER}'")
+            loader = DEFAULT_YAML_LOADER
+
+        return loader
+
+    @property
+    def io_workers(self) -> int:
+        """Number of threads used to read page files and write output files. If
+        0 then files are read and written one at a time.
+        """
+        return int(self.config.get('io_workers', self.wiki_config.io_workers))
     
     @property
     def noise_words(self) -> str:
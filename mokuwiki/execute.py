@@ -0,0 +1,268 @@
+"""Running the commands in exec directives, with a cache so that identical commands
+are only run once.
+"""
+import re
+import glob
+import json
+import time
+import hashlib
+import logging
+import importlib
+import subprocess
+from pathlib import Path
+from importlib.metadata import entry_points
+from concurrent.futures import ThreadPoolExecutor
+
+EXEC_CACHE_SCOPES = ['none', 'build', 'persistent']
+
+# e.g. %% ./report.sh data.csv # depends: data.csv %%, which the shell will ignore
+EXEC_DEPENDS_RE = r"#\s*depends:\s*(.*)$"
+
+# e.g. %% py:report level=3 %% calls the Python function registered as 'report'
+EXEC_CALLABLE_PREFIX = 'py:'
+EXEC_CALLABLE_GROUP = 'mokuwiki.directives'
+
+
+def run_command(command: str, timeout: float | None = None) -> subprocess.CompletedProcess:
+    """Run a shell command, capturing the output. A command that takes longer
+    than the timeout (in seconds) is stopped and has no output.
+    """
+
+    # TODO esacpe with shlex?
+    try:
+        return subprocess.run(command, shell=True, capture_output=True, universal_newlines=True, encoding='utf-8', timeout=timeout or None)
+    except subprocess.TimeoutExpired:
+        return subprocess.CompletedProcess(command, -1, '', f"timed out after {timeout} seconds")
+
+
+def hash_file(path: Path | str) -> str:
+    """Return a hash of a file's contents. BLAKE2 is in the standard
+    library and is quicker than SHA-256.
+    """
+    file_hash = hashlib.blake2b(digest_size=16)
+
+    with Path(path).open('rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            file_hash.update(chunk)
+
+    return file_hash.hexdigest()
+
+
+class ExecCache:
+    """A cache of the output of exec directives, keyed on a hash of the command,
+    the working directory and the contents of any files the command declares that
+    it depends on (using a '# depends: file1 file2' comment at the end of the
+    command, globs are allowed).
+
+    The scope of the cache is one of:
+
+    -  'none': every command is run every time
+    -  'build': each distinct command is run once per build (the default)
+    -  'persistent': outputs are also saved in the cache directory and re-used
+       by later builds, until they are older than the TTL (if given)
+    """
+
+    def __init__(self, scope: str = 'build', ttl: float = 0, cache_dir: Path | str | None = None, timeout: float = 0) -> None:
+        """Initialize an ExecCache instance.
+
+        Args:
+            scope (str, optional): One of 'none', 'build' or 'persistent'. Defaults to 'build'.
+            ttl (float, optional): Seconds before an output expires, 0 for never. Defaults to 0.
+            cache_dir (Path, optional): Where persistent outputs are saved. Defaults to None.
+            timeout (float, optional): Seconds before a command is stopped, 0 for never. Defaults to 0.
+        """
+        if scope not in EXEC_CACHE_SCOPES:
+            logging.warning(f"unknown exec cache scope '{scope}', using 'build'")
+            scope = 'build'
+
+        if scope == 'persistent' and not cache_dir:
+            logging.warning("no directory for persistent exec cache, using 'build'")
+            scope = 'build'
+
+        self.scope = scope
+        self.ttl = ttl or 0
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.timeout = timeout or 0
+
+        if self.scope == 'persistent':
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+        self._outputs = {} # key -> (time, output)
+
+    def key(self, command: str) -> str:
+        key = hashlib.blake2b(digest_size=16)
+        key.update(str(Path.cwd()).encode('utf-8') + b'\0' + command.encode('utf-8'))
+
+        depends = re.search(EXEC_DEPENDS_RE, command)
+
+        if depends:
+            for pattern in depends.group(1).split():
+                for path in sorted(glob.glob(pattern)) or [pattern]:
+                    file_hash = hash_file(path) if Path(path).is_file() else 'missing'
+                    key.update(f"\0{path}\0{file_hash}".encode('utf-8'))
+
+        return key.hexdigest()
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl > 0 and time.time() - created > self.ttl
+
+    def get(self, key: str) -> str | None:
+        """Return a cached output, or None if there is no (current) output."""
+
+        if key in self._outputs:
+            created, output = self._outputs[key]
+
+            if not self._expired(created):
+                return output
+
+        if self.scope != 'persistent':
+            return None
+
+        try:
+            with (self.cache_dir / f"{key}.json").open('r', encoding='utf8') as cf:
+                entry = json.load(cf)
+        except (IOError, ValueError):
+            return None
+
+        if self._expired(entry['time']):
+            return None
+
+        self._outputs[key] = (entry['time'], entry['output'])
+
+        return entry['output']
+
+    def put(self, key: str, command: str, output: str) -> None:
+
+        if self.scope == 'none':
+            return
+
+        created = time.time()
+
+        self._outputs[key] = (created, output)
+
+        if self.scope == 'persistent':
+            try:
+                with (self.cache_dir / f"{key}.json").open('w', encoding='utf8') as cf:
+                    json.dump({'command': command, 'time': created, 'output': output}, cf)
+            except IOError:
+                logging.warning(f"could not save exec cache entry for '{command}'")
+
+    def _execute(self, command: str, source: str = '') -> subprocess.CompletedProcess:
+        result = run_command(command, self.timeout)
+
+        if result.returncode != 0:
+            logging.warning(f"exec command '{command}' in '{source}' failed: {result.stderr.strip()}")
+        elif result.stderr:
+            logging.debug(f"exec command '{command}' in '{source}': {result.stderr.strip()}")
+
+        return result
+
+    def run(self, command: str, source: str = '') -> str:
+        """Return the output of a command, running it only if there is no cached
+        output. The output of a failed command is only kept for the current build.
+
+        Args:
+            command (str): The command
+            source (str, optional): The page using the command, for error messages. Defaults to ''.
+        """
+        if self.scope == 'none':
+            return self._execute(command, source).stdout
+
+        key = self.key(command)
+
+        output = self.get(key)
+
+        if output is None:
+            result = self._execute(command, source)
+            output = result.stdout
+
+            if result.returncode == 0:
+                self.put(key, command, output)
+            else:
+                self._outputs[key] = (time.time(), output)
+
+        return output
+
+    def prefetch(self, commands: dict[str, str], workers: int) -> None:
+        """Run commands that are not already cached concurrently, so that
+        their output is cached before pages are processed. Commands that are
+        mostly waiting (e.g. for I/O) benefit the most.
+
+        Args:
+            commands (dict): A map of each command to a page that uses it
+            workers (int): The maximum number of commands to run at once
+        """
+        if self.scope == 'none':
+            return
+
+        commands = {c: s for c, s in commands.items() if self.get(self.key(c)) is None}
+
+        if not commands:
+            return
+
+        logging.debug(f"running {len(commands)} exec commands with {workers} workers")
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # dict assignment in put() is atomic, so no locking is needed
+            list(executor.map(lambda c: self.run(c, commands[c]), commands))
+
+
+class CallableRegistry:
+    """Python functions that can be called from exec directives without starting
+    a new process, e.g. `%% py:report level=3 %%`. Functions are declared in the
+    config as a map of names to 'module:function' strings, or by installed packages
+    using the 'mokuwiki.directives' entry point group. A function is called with
+    the rest of the directive (as a string) and the page's metadata, and should
+    return a string.
+    """
+
+    def __init__(self, callables: dict[str, str] | None = None) -> None:
+        self._specs = dict(callables or {})
+        self._functions = {}
+
+    def _load(self, name: str):
+
+        if name in self._specs:
+            module_name, _, function_name = self._specs[name].partition(':')
+            return getattr(importlib.import_module(module_name), function_name)
+
+        for entry_point in entry_points(group=EXEC_CALLABLE_GROUP, name=name):
+            return entry_point.load()
+
+        raise LookupError(f"no callable registered as '{name}'")
+
+    def get(self, name: str):
+        """Return the function registered with the name, or None if it cannot be loaded."""
+
+        if name not in self._functions:
+            try:
+                self._functions[name] = self._load(name)
+            except (ImportError, AttributeError, LookupError, ValueError) as e:
+                logging.error(f"could not load callable '{name}': {e}")
+                self._functions[name] = None
+
+        return self._functions[name]
+
+    def call(self, directive: str, meta: dict, source: str = '') -> str:
+        """Call the function named in a directive, e.g. 'py:report level=3'.
+
+        Args:
+            directive (str): The directive, with or without the 'py:' prefix
+            meta (dict): The metadata of the page containing the directive
+            source (str, optional): The page, for error messages. Defaults to ''.
+        """
+        directive = directive.strip().removeprefix(EXEC_CALLABLE_PREFIX)
+        name, _, args = directive.partition(' ')
+
+        function = self.get(name)
+
+        if not function:
+            return ''
+
+        try:
+            output = function(args.strip(), meta)
+        except Exception as e:
+            logging.error(f"callable '{name}' in '{source}' failed: {e}")
+            return ''
+
+        return '' if output is None else str(output)
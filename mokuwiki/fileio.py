@@ -0,0 +1,389 @@
+"""Reading large page files through memory maps, so that only the parts of a
+file that need processing are decoded into strings, reading and writing
+files using a thread pool, to hide the latency of slow (e.g. network) file
+systems, and scanning directories once for all the lookups in a build.
+"""
+import os
+import re
+import mmap
+import fnmatch
+import logging
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import NamedTuple
+
+# the line that ends a metadata block, see META_END_RE in page.py
+META_END_RE = re.compile(rb"^[ \t]*\.\.\.[ \t]*\r?$", re.MULTILINE)
+
+# the start of any directive. All directives are contained in a single line, except
+# that the comment pattern can match a newline after the '//', so any byte that
+# is not printable ASCII is allowed there (this also covers Unicode whitespace)
+DIRECTIVE_MARKERS_RE = re.compile(rb"//[^\x21-\x7e]|<<|%%|\{\{|\[\[|!!|\^\^")
+
+WHITESPACE = frozenset(b' \t\n\r\x0b\x0c')
+
+# the line that ends a metadata block, once stripped
+META_END = b'...'
+
+
+class PageHead(NamedTuple):
+    """The stat of a page's file and its metadata block, see read_head()."""
+
+    stat: os.stat_result
+    meta: bytes | None
+    offset: int | None
+
+
+@contextmanager
+def map_file(path: Path | str):
+    """Memory map a file for reading. An empty file is mapped to b''."""
+
+    with Path(path).open('rb') as f:
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # cannot map an empty file
+            yield b''
+            return
+
+        try:
+            yield mapped
+        finally:
+            mapped.close()
+
+
+def find_meta_end(buffer) -> tuple[int, int] | None:
+    """Return the offsets of the line that ends the metadata block and of the
+    line after it (where the body starts), or None if there is no end.
+    """
+    match = META_END_RE.search(buffer)
+
+    if not match:
+        return None
+
+    newline = buffer.find(b'\n', match.end())
+
+    return match.start(), len(buffer) if newline == -1 else newline + 1
+
+
+def strip_span(buffer, start: int, end: int) -> tuple[int, int]:
+    """Return the span with leading and trailing (ASCII) whitespace removed."""
+
+    while start < end and buffer[start] in WHITESPACE:
+        start += 1
+
+    while end > start and buffer[end - 1] in WHITESPACE:
+        end -= 1
+
+    return start, end
+
+
+def find_directive_lines(buffer, start: int, end: int) -> list[tuple[int, int]]:
+    """Return the spans of the lines that may contain directives, merging
+    adjacent lines. Each span ends before a newline (or at the end).
+    """
+    spans = []
+
+    for match in DIRECTIVE_MARKERS_RE.finditer(buffer, start, end):
+        line_start = max(start, buffer.rfind(b'\n', start, match.start()) + 1)
+
+        # for a comment the line may include the next one, see above
+        line_end = buffer.find(b'\n', match.end(), end)
+        line_end = end if line_end == -1 else line_end
+
+        if spans and line_start <= spans[-1][1]:
+            spans[-1] = (spans[-1][0], max(spans[-1][1], line_end))
+        else:
+            spans.append((line_start, line_end))
+
+    return spans
+
+
+def split_spans(start: int, end: int, spans: list[tuple[int, int]]) -> list[tuple[int, int, bool]]:
+    """Split a span into the given spans and the gaps between them, returning
+    (start, end, is_given) tuples in order.
+    """
+    parts = []
+
+    for span_start, span_end in spans:
+        if span_start > start:
+            parts.append((start, span_start, False))
+
+        parts.append((span_start, span_end, True))
+        start = span_end
+
+    if start < end:
+        parts.append((start, end, False))
+
+    return parts
+
+
+class DirScan:
+    """The files in a directory, read by a single os.scandir() pass. Each
+    file's stat is cached, so a file is only stat'ed once however often it is
+    looked up. The names of its sub-directories (not including symbolic links
+    to directories) are kept too. If the directory does not exist then it has
+    no files.
+    """
+
+    def __init__(self, path: Path | str) -> None:
+        self.path = Path(path)
+        self.entries = {}
+        self.dirs = []
+
+        try:
+            with os.scandir(self.path) as it:
+                for entry in it:
+                    if entry.is_file():
+                        self.entries[entry.name] = entry
+                    elif entry.is_dir(follow_symlinks=False):
+                        self.dirs.append(entry.name)
+        except OSError:
+            pass
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.entries
+
+    def glob(self, pattern: str) -> list[Path]:
+        """Return the paths of the files whose names match a pattern, in the
+        order they were scanned (as for Path.glob()).
+        """
+        if not glob_has_magic(pattern):
+            # the file may have been created since the scan, e.g. by an exec directive
+            if pattern in self.entries or (self.path / pattern).is_file():
+                return [self.path / pattern]
+
+            return []
+
+        return [self.path / name for name in fnmatch.filter(self.entries, pattern)]
+
+    def stat(self, name: str) -> os.stat_result | None:
+        """Return the stat of a file, or None if it cannot be stat'ed."""
+
+        try:
+            return self.entries[name].stat()
+        except (KeyError, OSError):
+            return None
+
+
+def glob_has_magic(pattern: str) -> bool:
+    return any(c in pattern for c in '*?[')
+
+
+def split_pattern(pattern: str) -> tuple[str, ...]:
+    """Split a path pattern (e.g. 'rules/**/*.md') into its parts."""
+
+    return tuple(part for part in pattern.replace(os.sep, '/').split('/') if part not in ('', '.'))
+
+
+def match_parts(pattern: tuple[str, ...], parts: tuple[str, ...]) -> bool:
+    """Return True if a path (split into parts) matches a pattern (split into
+    parts). Each part of the path is matched as for Path.glob(), so '*' does
+    not match a '/', except that a '**' part matches any number of parts
+    (including none).
+    """
+    if not pattern:
+        return not parts
+
+    if pattern[0] == '**':
+        return match_parts(pattern[1:], parts) or (bool(parts) and match_parts(pattern, parts[1:]))
+
+    return bool(parts) and fnmatch.fnmatch(parts[0], pattern[0]) and match_parts(pattern[1:], parts[1:])
+
+
+def match_below(pattern: tuple[str, ...], parts: tuple[str, ...]) -> bool:
+    """Return True if a path in the directory 'parts' could match a pattern,
+    i.e. if the directory needs to be searched.
+    """
+    if not parts:
+        return bool(pattern)
+
+    if not pattern:
+        return False
+
+    if pattern[0] == '**':
+        return True
+
+    return fnmatch.fnmatch(parts[0], pattern[0]) and match_below(pattern[1:], parts[1:])
+
+
+def find_files(root: Path, include: list[str], exclude: list[str] | None = None,
+               scan_dir: Callable[[Path], DirScan] = DirScan) -> list[Path]:
+    """Return the files under a directory that match any of the 'include'
+    patterns, but none of the 'exclude' patterns, see match_parts(). Patterns
+    are relative to the directory. Sub-directories are only searched if an
+    include pattern could match a file in them and they do not match an
+    exclude pattern (so 'assets' or '**/drafts' skip those directories
+    entirely). Files are listed in the order they are scanned, with the files
+    in a directory before those in its sub-directories.
+
+    Args:
+        root (Path): The directory to search.
+        include (list): Patterns of the files to list.
+        exclude (list, optional): Patterns of files and directories to skip.
+        Defaults to None.
+        scan_dir (callable, optional): Returns the DirScan of a directory, e.g.
+        to re-use earlier scans. Defaults to DirScan.
+    """
+    include = [split_pattern(p) for p in include]
+    exclude = [split_pattern(p) for p in exclude or []]
+
+    files = []
+
+    def search(parts: tuple[str, ...]) -> None:
+        scan = scan_dir(root.joinpath(*parts))
+
+        for name in scan.entries:
+            path = parts + (name,)
+
+            if any(match_parts(p, path) for p in include) and not any(match_parts(p, path) for p in exclude):
+                files.append(scan.path / name)
+
+        for name in scan.dirs:
+            path = parts + (name,)
+
+            if any(match_parts(p, path) for p in exclude) or not any(match_below(p, path) for p in include):
+                continue
+
+            search(path)
+
+    search(())
+
+    return files
+
+
+def read_head(path: Path | str) -> PageHead | None:
+    """Stat a page's file and read its metadata block, i.e. up to the line '...'.
+    The offset is where the body starts. If there is no end to the metadata
+    then 'meta' and 'offset' are None. Returns None if the file cannot be read,
+    in which case the page reports the error when it reads the file itself.
+    """
+    lines = []
+
+    try:
+        with Path(path).open('rb') as f:
+            stat = os.fstat(f.fileno())
+
+            for line in f:
+                if line.strip() == META_END:
+                    return PageHead(stat, b''.join(lines), f.tell())
+
+                lines.append(line)
+    except OSError:
+        return None
+
+    return PageHead(stat, None, None)
+
+
+def prefetch(function: Callable, items: Iterable, workers: int = 0, ahead: int = 0) -> Iterator:
+    """Return the results of calling a function on each item, in order. If
+    workers > 0 then the calls are made by a pool of threads, up to 'ahead'
+    items (default 4 per worker) before the result is needed, so that the
+    time spent waiting for (e.g.) files to be read overlaps.
+    """
+    if workers <= 0:
+        for item in items:
+            yield function(item)
+        return
+
+    ahead = max(ahead, workers * 4)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='mokuwiki-read') as executor:
+        pending = deque()
+
+        try:
+            for item in items:
+                pending.append(executor.submit(function, item))
+
+                if len(pending) >= ahead:
+                    yield pending.popleft().result()
+
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            # e.g. if the caller stops early
+            for future in pending:
+                future.cancel()
+
+
+class FileWriter:
+    """Write files using a pool of threads. At most 'pending' files (default 4
+    per worker) are waiting to be written at any time, after which write()
+    blocks, so the contents of the files do not all stay in memory. If workers
+    is 0 then files are written straight away. Use as a context manager, or
+    call close() to wait for all files to be written.
+    """
+
+    def __init__(self, workers: int = 0, pending: int = 0) -> None:
+        self.workers = workers
+        self._executor = None
+        self._slots = None
+
+        if workers > 0:
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='mokuwiki-write')
+            self._slots = threading.BoundedSemaphore(max(pending, workers * 4))
+
+    def __enter__(self) -> 'FileWriter':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def write(self, path: Path | str, *parts: str) -> None:
+        """Write a text file made of one or more parts, e.g. a page's metadata
+        and body, without joining them.
+        """
+        self.submit(write_file, path, *parts)
+
+    def submit(self, function: Callable, *args) -> None:
+        """Call a function that writes a file, e.g. write_segments()."""
+
+        if self._executor is None:
+            function(*args)
+            return
+
+        self._slots.acquire()
+        self._executor.submit(function, *args).add_done_callback(self._done)
+
+    def _done(self, future: Future) -> None:
+        self._slots.release()
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+
+def write_file(path: Path | str, *parts: str) -> None:
+    """Write a text file made of one or more parts, logging an error if it
+    cannot be written.
+    """
+    try:
+        with Path(path).open('w', encoding='utf8') as f:
+            for part in parts:
+                f.write(part)
+    except IOError:
+        logging.error(f"could not write output file '{path}'")
+
+
+def write_segments(path: Path | str, header: str, source: Path | str, segments: list) -> None:
+    """Write a text file made of a header and the segments of another file,
+    each of which is either a string or the (start, end) offsets of a span
+    of that file, which is copied without being decoded. Logs an error if
+    the file cannot be written.
+    """
+    try:
+        with Path(path).open('wb') as f, map_file(source) as buffer:
+            f.write(header.encode('utf8'))
+
+            with memoryview(buffer) as view:
+                for segment in segments:
+                    f.write(segment.encode('utf8') if isinstance(segment, str) else view[segment[0]:segment[1]])
+    except IOError:
+        logging.error(f"could not write output file '{path}'")
@@ -1,13 +1,15 @@
-import re
 import json
+import bisect
 import datetime
 import logging
 from pathlib import Path
 from collections import defaultdict
 from typing import TYPE_CHECKING
 
+from mokuwiki.analyzer import Analyzer
 from mokuwiki.page import Page
-from mokuwiki.utils import make_file_name
+from mokuwiki.query import QueryError, compile_query, execute_plan, get_namespaces, to_number
+from mokuwiki.utils import get_meta_value, make_file_name
 
 if TYPE_CHECKING:
     from mokuwiki.namespace import Namespace
@@ -37,10 +39,21 @@ class Index:
         # TODO check if saved index exists and is older than mtime of ns path
         self._titles = {} # a map of titles (from page meta) to targets (i.e. slugified title for output)
         self._aliases = {} # a map of aliases to titles
-        self._tags = defaultdict(set) # a map of tags by page title
+        self._page_ids = {} # a map of titles to integer page ids, used in tag bitmaps
+        self._pages = [] # a list of pages, indexed by page id
+        self._tags = defaultdict(int) # a map of tags to a bitmap of page ids
+        self._meta = {field: MetaIndex(field) for field in namespace.config.meta_indexes or []} # a map of metadata fields to MetaIndex objects
+        self._tag_queries = {} # a cache of compiled tag queries to bitmaps
         self._broken = set()
         self._search = defaultdict(list)
 
+        config = self.namespace.config
+
+        self.analyzer = Analyzer(config.search_tokenizer,
+                                 config.search_folding,
+                                 config.search_stemmer,
+                                 config.noise_words)
+
         self.modified = datetime.datetime.now()
 
     def save(self) -> None:
@@ -71,9 +84,19 @@ class Index:
                self._aliases[alias] = page.title
 
         self._titles[page.title] = page.target
-    
+
+        page_id = len(self._pages)
+        self._page_ids[page.title] = page_id
+        self._pages.append(page)
+
         for tag in page.tags:
-            self._tags[tag].add(page.title)
+            self._tags[tag] |= 1 << page_id
+
+        for meta_index in self._meta.values():
+            meta_index.add(page_id, page.meta)
+
+        # any cached tag queries may now be out of date
+        self._tag_queries.clear()
 
         self._update_search_index(page)
 
@@ -95,6 +118,13 @@ class Index:
     def get_title_by_alias(self, alias: str) -> str|None:
         return self._aliases[alias] if alias in self._aliases else None
     
+    def get_page(self, page_name: str) -> Page | None:
+        """Get a page from its title or alias."""
+
+        page_name = self._aliases.get(page_name, page_name)
+
+        return self._pages[self._page_ids[page_name]] if page_name in self._page_ids else None
+
     def get_alias(self, page_name: str) -> str:
         return self._aliases[page_name] if self.has_alias(page_name) else ''
     
@@ -108,7 +138,89 @@ class Index:
         if not self.has_tag(tag_name):
             return set()
         
-        return self._tags[tag_name]
+        return set(self.get_titles_by_bits(self._tags[tag_name]))
+
+    def get_tagged_bits(self, tag_name: str) -> int:
+        """Return a bitmap of the ids of pages that have the tag, i.e. if
+        bit N is set then the page with id N has that tag.
+        """
+        return self._tags[tag_name] if self.has_tag(tag_name) else 0
+
+    def get_all_bits(self) -> int:
+        return (1 << len(self._pages)) - 1
+
+    def get_meta_index(self, field: str) -> 'MetaIndex':
+        """Get the index of a metadata field, creating it if it was not
+        one of the configured 'meta_indexes'.
+        """
+        if field not in self._meta:
+            meta_index = MetaIndex(field)
+
+            for page_id, page in enumerate(self._pages):
+                meta_index.add(page_id, page.meta)
+
+            self._meta[field] = meta_index
+
+        return self._meta[field]
+
+    def get_meta_bits(self, field: str, op: str, value: str) -> int:
+        """Return a bitmap of the ids of pages whose metadata field compares
+        with the value, e.g. `get_meta_bits('level', '>', '3')`.
+        """
+        return self.get_meta_index(field).lookup(op, value)
+
+    def sort_titles(self, titles: list[str], field: str, reverse: bool = False) -> list[str]:
+        """Sort page titles by the value of a metadata field, using the field's
+        index rather than the pages. Numbers sort before strings, and pages without
+        the field are always last. Ties are sorted by title.
+        """
+        ranks = self.get_meta_index(field).get_ranks()
+        missing = len(self._pages)
+
+        ranked = sorted(titles, key=lambda t: (ranks.get(self._page_ids[t], missing), t))
+
+        if reverse:
+            # keep pages without the field at the end
+            present = [t for t in ranked if self._page_ids[t] in ranks]
+            ranked = present[::-1] + ranked[len(present):]
+
+        return ranked
+
+    def get_titles_by_bits(self, bits: int) -> list[str]:
+        """Convert a bitmap of page ids into a list of titles, in id order.
+        """
+        titles = []
+
+        # clearing one bit at a time creates a new int for each page, so scan the
+        # binary digits instead, lowest first
+        digits = bin(bits)[:1:-1]
+        page_id = digits.find('1')
+
+        while page_id != -1:
+            titles.append(self._pages[page_id].title)
+            page_id = digits.find('1', page_id + 1)
+
+        return titles
+
+    def query(self, query: str) -> list[str]:
+        """Return the titles of pages matching a tag query, e.g. `abc &def !xyz` or
+        `(abc OR def) AND level>3` (see mokuwiki.query for the syntax). Results are
+        cached for each distinct compiled query.
+
+        Raises:
+            QueryError: if the query is invalid or refers to another namespace
+        """
+        plan = compile_query(query)
+
+        if plan not in self._tag_queries:
+
+            for alias in get_namespaces(plan):
+                if self.namespace.wiki.get_namespace(alias) is not self.namespace:
+                    raise QueryError(f"tag query '{query}' refers to namespace '{alias}'")
+
+            self._tag_queries[plan] = execute_plan(plan, self)
+
+        return self.get_titles_by_bits(self._tag_queries[plan])
 
     def add_broken(self, broken_name: str) -> None:
         self._broken.add(broken_name)
@@ -150,16 +262,16 @@ class Index:
                 else:
                     logging.warning(f"unknown metadata type '{field}' in page '{page.title}'")
 
-        # remove punctuation etc from YAML values, make lower case
-        terms = re.sub('[^a-z0-9 ]', '', terms.lower())
-
-        # remove noise words
-        terms = [term for term in terms.split() if term not in self.namespace.config.noise_words]
+        # tokenize, remove noise words, stem etc
+        terms = self.analyzer.analyze(terms)
 
         # update index of unique terms
         for term in list(set(terms)):
             self._search[term].append((make_file_name(page.title), page.title))
 
+    def get_search_index(self) -> dict:
+        return self._search
+
     def export_search_index(self) -> None:
         """Save the search index as a JSON file. The file name is given
         by the 'search_file' configuration option.
@@ -170,3 +282,108 @@ class Index:
 
         with Path(self.namespace.config.target_dir / self.namespace.config.search_file).open('w', encoding='utf8') as jf:
             jf.write(search_index)
+
+
+class MetaIndex:
+    """An index of the values of one metadata field, so that pages can be
+    selected by comparing that field with a value without visiting every page.
+    Numbers (and strings that look like numbers) are compared numerically, other
+    values as strings. If the field is a list then each item is indexed.
+    """
+
+    def __init__(self, field: str) -> None:
+        self.field = field
+
+        self._values = defaultdict(int) # a map of values to a bitmap of page ids
+        self._all = 0 # bitmap of all pages with this field
+        self._entries = {float: [], str: []} # (value, page id) pairs, sorted on demand
+        self._keys = {float: [], str: []} # the sorted values, for bisection
+        self._ranks = {} # a map of page id to sort position
+        self._sorted = True
+
+    @staticmethod
+    def normalise(value) -> float | str:
+        number = to_number(value)
+
+        if number is not None:
+            return number
+
+        if isinstance(value, bool):
+            return str(value).lower()
+
+        return str(value)
+
+    def add(self, page_id: int, meta: dict) -> None:
+        value = get_meta_value(meta, self.field)
+
+        if value is None:
+            return
+
+        for item in value if isinstance(value, list) else [value]:
+
+            if item is None or isinstance(item, (dict, list)):
+                continue
+
+            key = self.normalise(item)
+
+            self._values[key] |= 1 << page_id
+            self._all |= 1 << page_id
+            self._entries[type(key)].append((key, page_id))
+
+        self._sorted = False
+
+    def _sort(self) -> None:
+        self._ranks = {}
+
+        for kind, entries in self._entries.items():
+            entries.sort()
+            self._keys[kind] = [key for key, _ in entries]
+
+            # a page with a list of values is ranked by its lowest value
+            for _, page_id in entries:
+                self._ranks.setdefault(page_id, len(self._ranks))
+
+        self._sorted = True
+
+    def get_ranks(self) -> dict[int, int]:
+        """Return a map of page ids to their position when sorted by this field.
+        """
+        if not self._sorted:
+            self._sort()
+
+        return self._ranks
+
+    def lookup(self, op: str, value) -> int:
+        """Return a bitmap of the ids of pages where `field op value` is true.
+        """
+        key = self.normalise(value)
+
+        if op == '=':
+            return self._values.get(key, 0)
+
+        if op == '!=':
+            return self._all & ~self._values.get(key, 0)
+
+        if not self._sorted:
+            self._sort()
+
+        keys = self._keys[type(key)]
+        entries = self._entries[type(key)]
+
+        if op == '<':
+            entries = entries[:bisect.bisect_left(keys, key)]
+        elif op == '<=':
+            entries = entries[:bisect.bisect_right(keys, key)]
+        elif op == '>':
+            entries = entries[bisect.bisect_right(keys, key):]
+        elif op == '>=':
+            entries = entries[bisect.bisect_left(keys, key):]
+        else:
+            raise QueryError(f"unknown comparison '{op}'")
+
+        bits = 0
+
+        for _, page_id in entries:
+            bits |= 1 << page_id
+
+        return bits
@@ -0,0 +1,350 @@
+"""The build manifest, a JSON file in the build dir that records the source
+files and rendered pages of the last build. In incremental mode pages whose
+source, and everything else their output depends on, have not changed since
+the last build are not rendered again.
+
+Files are compared by a hash of their contents rather than their modification
+time, which is reset by (e.g.) git checkouts and rsync, but a file is only
+hashed again if its size or modification time has changed.
+
+The render cache is a directory of rendered pages, keyed by the hashes of
+everything the output depends on, that can be kept between builds (e.g. by a
+CI system) even when the build dir is not.
+"""
+import os
+import json
+import hashlib
+import logging
+from pathlib import Path
+
+MANIFEST_FILE = '_manifest.json'
+MANIFEST_VERSION = 2
+
+HASH_BLOCK_SIZE = 1 << 20
+
+# options that do not change the output of a build
+BUILD_OPTIONS = ['verbose', 'clean', 'incremental', 'content', 'content_include', 'content_exclude',
+                 'build_dir', 'target_dir', 'exec_workers', 'exec_cache', 'exec_cache_dir',
+                 'exec_cache_ttl', 'stream', 'mmap_threshold', 'io_workers', 'yaml_loader',
+                 'preprocessing', 'postprocessing', 'render_cache_dir', 'meta_indexes', 'namespace_workers']
+
+# options that only affect one stage of the build. The search index is exported
+# on every build, so search options never cause pages to be rendered again.
+# Any other option affects the rendering of every page
+STAGE_OPTIONS = {
+    'search': ['search_fields', 'search_prefix', 'search_file', 'search_merged_file',
+               'search_tokenizer', 'search_folding', 'search_stemmer', 'noise_words'],
+    'templates': ['templates'],
+    'links': ['broken_css', 'meta_links_broken'],
+    'tags': ['tags_css'],
+    'images': ['media_dir'],
+    'custom': ['custom_css'],
+    'exec': ['exec_callables', 'exec_timeout']
+}
+
+# the markers of the directives that use each stage, a page only depends on the
+# options of a stage if its file contains one of them
+STAGE_MARKERS = {
+    'templates': ['<<', '{{'],
+    'links': ['[[', '!!'],
+    'tags': ['{{'],
+    'images': ['!!'],
+    'custom': ['^^'],
+    'exec': ['%%']
+}
+
+MARKERS = sorted({m for markers in STAGE_MARKERS.values() for m in markers})
+
+
+def hash_file(path: Path | str) -> tuple[str, list[str]]:
+    """Return a hash of the contents of a file, and the directive markers (see
+    STAGE_MARKERS) that it contains.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+
+    markers = {m: m.encode('utf8') for m in MARKERS}
+    found = []
+    last = b''
+
+    with Path(path).open('rb') as f:
+        while block := f.read(HASH_BLOCK_SIZE):
+            digest.update(block)
+
+            # markers are two bytes long, so may be split between blocks
+            window = last + block
+
+            for marker in [m for m in markers if markers[m] in window]:
+                found.append(marker)
+                del markers[marker]
+
+            last = block[-1:]
+
+    return digest.hexdigest(), sorted(found)
+
+
+def hash_data(data) -> str:
+    """Return a hash of some JSON-like data, e.g. page metadata. Values that
+    are not JSON types (such as dates) are hashed as strings.
+    """
+    text = json.dumps(data, sort_keys=True, default=str, separators=(',', ':'))
+
+    return hashlib.blake2b(text.encode('utf8'), digest_size=16).hexdigest()
+
+
+def config_fingerprints(config: dict) -> dict[str, str]:
+    """Return hashes of the options in a wiki's configuration (including those
+    of each namespace) used by each stage of the build (see STAGE_OPTIONS),
+    with the options used by every page as the 'render' stage. Options that
+    do not change the output of a build are ignored. Pages in one namespace
+    can link to pages in another, so the stages are not split by namespace.
+    """
+    stage_options = {o: stage for stage, options in STAGE_OPTIONS.items() for o in options}
+
+    stages = {stage: {'wiki': {}, 'namespaces': {}} for stage in ['render', *STAGE_OPTIONS]}
+
+    def split_options(options: dict, name: str | None = None) -> None:
+        for option, value in options.items():
+            if option in BUILD_OPTIONS or option == 'namespaces':
+                continue
+
+            stage = stages[stage_options.get(option, 'render')]
+
+            if name is None:
+                stage['wiki'][option] = value
+            else:
+                stage['namespaces'].setdefault(name, {})[option] = value
+
+    split_options(config)
+
+    for name, options in (config.get('namespaces') or {}).items():
+        split_options(options or {}, name)
+
+    return {stage: hash_data(options) for stage, options in stages.items()}
+
+
+class Manifest:
+    """The files and pages of the last build, and those of the current build
+    as they are added. Nothing is read or written unless the manifest is enabled.
+    """
+
+    def __init__(self, path: Path | str, enabled: bool = False, incremental: bool = False) -> None:
+        """Initialize a Manifest instance, reading the manifest of the last
+        build if it exists.
+
+        Args:
+            path (Path): The manifest file.
+            enabled (bool, optional): If False then the manifest does nothing.
+            Defaults to False.
+            incremental (bool, optional): If True then pages that have not changed
+            since the last build are skipped. Defaults to False.
+        """
+        self.path = Path(path)
+        self.enabled = enabled
+        self.incremental = enabled and incremental
+
+        # from the last build
+        self.last_files = {}
+        self.last_pages = {}
+
+        # for this build
+        self.files = {}
+        self.pages = {}
+
+        # hashes of everything (apart from its source) that a page depends on, see Wiki.process_wiki()
+        self.index = ''
+        self.fingerprints = {}
+
+        if enabled:
+            self.load()
+
+    def load(self) -> None:
+
+        try:
+            with self.path.open('r', encoding='utf8') as mf:
+                manifest = json.load(mf)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError):
+            logging.warning(f"could not read build manifest '{self.path}', rendering all pages")
+            return
+
+        if not isinstance(manifest, dict) or manifest.get('version') != MANIFEST_VERSION:
+            return
+
+        self.last_files = manifest.get('files', {})
+        self.last_pages = manifest.get('pages', {})
+
+    def save(self) -> None:
+        if not self.enabled:
+            return
+
+        manifest = {'version': MANIFEST_VERSION, 'files': self.files, 'pages': self.pages}
+
+        # write to a temporary file first, so an interrupted build does not leave half a manifest
+        temp_path = self.path.with_name(self.path.name + '.tmp')
+
+        try:
+            with temp_path.open('w', encoding='utf8') as mf:
+                json.dump(manifest, mf, separators=(',', ':'))
+
+            os.replace(temp_path, self.path)
+        except OSError:
+            logging.error(f"could not write build manifest '{self.path}'")
+
+    def file_hash(self, key: str, path: Path | str, stat: os.stat_result | None = None) -> str:
+        """Return the hash of a file's contents. If the file's size and
+        modification time are the same as in the last build then the hash
+        from the last build is used.
+
+        Args:
+            key (str): The name of the file in the manifest, which does not
+            depend on where the wiki is (e.g. the namespace and relative path).
+            path (Path): The file.
+            stat (os.stat_result, optional): The file's stat, if known. Defaults to None.
+        """
+        if key in self.files:
+            return self.files[key]['hash']
+
+        if stat is None:
+            stat = os.stat(path)
+
+        last = self.last_files.get(key)
+
+        if last and last['size'] == stat.st_size and last['mtime'] == stat.st_mtime_ns:
+            file_hash, markers = last['hash'], last['markers']
+        else:
+            file_hash, markers = hash_file(path)
+
+        self.files[key] = {'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'hash': file_hash, 'markers': markers}
+
+        return file_hash
+
+    def page_stages(self, key: str) -> set[str]:
+        """Return the stages whose options a page depends on (apart from 'render',
+        which every page depends on), from the directive markers in its file.
+        The page's file must have been hashed by file_hash() first.
+        """
+        markers = self.files[key]['markers']
+
+        return {stage for stage, stage_markers in STAGE_MARKERS.items() if any(m in markers for m in stage_markers)}
+
+    def page_config(self, stages: set[str]) -> dict[str, str]:
+        """Return the fingerprints of the options of the given stages, and the 'render' stage."""
+
+        return {stage: self.fingerprints.get(stage, '') for stage in ['render', *sorted(stages)]}
+
+    def page_record(self, key: str, stages: set[str], dependent: bool = False) -> dict:
+        """Return what the output of a page depends on in this build. The page's
+        file must have been hashed by file_hash() first.
+
+        Args:
+            key (str): The name of the page's file in the manifest.
+            stages (set): The stages the page depends on, see page_stages().
+            dependent (bool, optional): True if the page also depends on
+            other files or commands (i.e. include or exec directives), and so
+            must always be rendered. Defaults to False.
+        """
+        return {'hash': self.files[key]['hash'], 'index': self.index, 'config': self.page_config(stages), 'dependent': dependent}
+
+    def unchanged(self, key: str, stages: set[str]) -> bool:
+        """Return True if a page's output from the last build is still valid,
+        i.e. its file and everything else it depends on have not changed. The
+        page is added to this build's manifest if so.
+        """
+        if not self.incremental or key not in self.files:
+            return False
+
+        last = self.last_pages.get(key)
+
+        if not last or last.get('dependent', True) or last != self.page_record(key, stages):
+            return False
+
+        self.pages[key] = last
+
+        return True
+
+    def add_page(self, key: str, stages: set[str], dependent: bool = False) -> None:
+        """Add a page that has been rendered to this build's manifest."""
+
+        if self.enabled and key in self.files:
+            self.pages[key] = self.page_record(key, stages, dependent)
+
+
+class RenderDeps:
+    """The files and directories (other than its own file) that the output of a
+    page depends on, recorded while the page is rendered. Directories are
+    those searched by include directives, so that new matching files are
+    noticed. Pages with exec directives depend on the output of commands, so
+    they are 'volatile' and cannot be cached.
+    """
+
+    def __init__(self) -> None:
+        self.files = set()
+        self.dirs = set()
+        self.volatile = False
+
+
+class RenderCache:
+    """A directory of rendered pages. Each page has a record, keyed by the hash
+    of its file, the index digest and the config fingerprint, that lists the
+    files and directories it depends on (relative to the page's directory).
+    The rendered page is keyed by that key and the hashes of the files and
+    directory listings, so it is only used if none of them have changed.
+    Nothing is ever removed from the cache.
+    """
+
+    def __init__(self, path: Path | str | None) -> None:
+        self.path = Path(path) if path else None
+        self.enabled = bool(path)
+
+        if self.enabled:
+            self.path.mkdir(parents=True, exist_ok=True)
+
+    def _file(self, key: str, suffix: str) -> Path:
+        # spread files over sub-directories so no directory gets too large
+        return self.path / key[:2] / (key + suffix)
+
+    def _read(self, key: str, suffix: str) -> str | None:
+        try:
+            with self._file(key, suffix).open('r', encoding='utf8') as cf:
+                return cf.read()
+        except OSError:
+            return None
+
+    def _write(self, key: str, suffix: str, *parts: str) -> None:
+        path = self._file(key, suffix)
+        temp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+
+        try:
+            path.parent.mkdir(exist_ok=True)
+
+            with temp_path.open('w', encoding='utf8') as cf:
+                for part in parts:
+                    cf.write(part)
+
+            os.replace(temp_path, path)
+        except OSError:
+            logging.warning(f"could not write to render cache '{path}'")
+
+    def get_record(self, key: str) -> dict | None:
+        """Return the dependencies recorded for a page, or None."""
+
+        record = self._read(key, '.json')
+
+        try:
+            return json.loads(record) if record else None
+        except ValueError:
+            return None
+
+    def get(self, key: str) -> str | None:
+        """Return a rendered page, or None."""
+
+        return self._read(key, '.md')
+
+    def put(self, key: str, record: dict, output_key: str, *parts: str) -> None:
+        """Save the dependencies of a page, and the rendered page (e.g. its
+        metadata and body, without joining them).
+        """
+
+        self._write(key, '.json', json.dumps(record, separators=(',', ':')))
+        self._write(output_key, '.md', *parts)
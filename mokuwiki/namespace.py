@@ -1,8 +1,13 @@
+import os
 from pathlib import Path
+from itertools import repeat
 import logging
 from typing import TYPE_CHECKING
+from collections.abc import Iterator
 
 from mokuwiki.page import Page
+from mokuwiki.fileio import DirScan, FileWriter, find_files, prefetch, read_head
+from mokuwiki.manifest import RenderDeps, hash_data
 from mokuwiki.config import NamespaceConfig, DEFAULT_META_HOME, DEFAULT_META_NEXT, DEFAULT_META_PREV, DEFAULT_META_LINKS
 import mokuwiki.index as idx
 from mokuwiki.process import Processor
@@ -55,15 +60,23 @@ class Namespace:
         self.index = idx.Index(self)
         self.processor = Processor()
 
-        # TODO test support for '**' in glob spec, with recursive=True
         # titles must be unique? or allow path to be multivalued
         # or ensure there is a pre stage that copies the files in the build file, then they would
         # need to be unique
 
         self.pages = []
 
-        # self.modified = os.path.getmtime(self.config.target)
-        self.modified = self.config.target_dir.stat().st_mtime
+        # rendered tag directives, keyed by the directive's arguments
+        self.tags_cache = {}
+
+        # directories scanned for pages and included files, keyed by path
+        self.dir_scans = {}
+
+        # names of the page files in the build manifest, keyed by path (incremental mode or render cache only)
+        self.page_keys = {}
+
+        # the dependencies of the page being rendered, if it is to be saved in the render cache
+        self.render_deps = None
 
         logging.info(f"created namespace '{self.name}'")
 
@@ -78,6 +91,29 @@ class Namespace:
     def __eq__(self, other) -> bool:
         return True if self.title == other.title else False
 
+    @property
+    def modified(self) -> float:
+        return self.config.target_dir.stat().st_mtime
+
+    def scan_dir(self, path: Path) -> DirScan:
+        """Return the files in a directory, scanning it the first time it is
+        needed. Pages and included files are looked up in the scans, so each
+        directory is only read, and each file stat'ed, once per build.
+        """
+        scan = self.dir_scans.get(path)
+
+        if scan is None:
+            scan = self.dir_scans[path] = DirScan(path)
+
+        return scan
+
+    def stat_file(self, path: Path) -> os.stat_result | None:
+        """Return the stat of a file from the scan of its directory, if it has been scanned."""
+
+        scan = self.dir_scans.get(path.parent)
+
+        return scan.stat(path.name) if scan is not None else None
+
     def preprocess_pages(self) -> None:
         self.processor.process(self.config.preprocessing)        
         logging.debug(f"pre-processed namespace '{self.name}'")
@@ -87,31 +123,73 @@ class Namespace:
         logging.debug(f"post-processed namespace '{self.name}'")
 
     def load_pages(self) -> None:
+
+        for page in self.read_pages():
+            self.index_page(page)
+
+        logging.debug(f"loaded namespace '{self.name}'")
+
+    def read_pages(self) -> Iterator[Page]:
+        """Create the pages in the namespace's content dirs, hashing their files
+        if the build manifest is enabled. The pages are not indexed, see index_page().
+        """
+
+        profiler = self.wiki.profiler
+
+        manifest = self.wiki.manifest
+
+        page_paths = []
         
-        for content_dir in self.config.content_dirs:
+        for n, content_dir in enumerate(self.config.content_dirs):
             
             if not content_dir or not Path(content_dir).is_dir():
                 logging.warning(f"namespace path '{content_dir}' does not exist, skipping")
                 continue
             
-            for page_path in content_dir.glob('*.md'):
-                # pass in ref to namespace
-                try:
-                    page = Page(page_path, self)
-                except ValueError:
-                    logging.error(f"page '{page_path}' could not be created")
-                    continue
-                
-                # now index page
+            found = find_files(content_dir, self.config.content_include, self.config.content_exclude, self.scan_dir)
+
+            # the manifest names files relative to the content dir, so a wiki can be built in a different place
+            if manifest.enabled:
+                for page_path in found:
+                    self.page_keys[page_path] = f"{self.name}/{n}/{page_path.relative_to(content_dir).as_posix()}"
+
+            page_paths.extend(found)
+
+        # with io_workers the metadata of the following pages is read while each page is loaded
+        heads = prefetch(read_head, page_paths, self.config.io_workers) if self.config.io_workers > 0 else repeat(None)
+
+        for page_path, head in zip(page_paths, heads):
+            # pass in ref to namespace
+            try:
+                with profiler.phase('load', self.name):
+                    page = Page(page_path, self, head=head, stat=self.stat_file(page_path))
+            except ValueError:
+                logging.error(f"page '{page_path}' could not be created")
+                continue
+
+            if page_path in self.page_keys:
                 try:
-                    self.index.add_page(page)
-                except ValueError:
-                    logging.warning(f"page '{page.title}' or elements already exists in index")
-                    continue
-                
-                self.pages.append(page)
+                    manifest.file_hash(self.page_keys[page_path], page_path, self.stat_file(page_path))
+                except OSError:
+                    # the page is always rendered
+                    del self.page_keys[page_path]
 
-        logging.debug(f"loaded namespace '{self.name}'")
+            yield page
+
+    def index_page(self, page: Page) -> None:
+        """Add a page created by read_pages() to the index and the namespace."""
+
+        try:
+            with self.wiki.profiler.phase('index', self.name):
+                self.index.add_page(page)
+        except ValueError:
+            logging.warning(f"page '{page.title}' or elements already exists in index")
+            return
+
+        # the body is only needed for indexing if the '_body_' field is searched
+        page.release()
+        
+        self.pages.append(page)
 
     def get_page(self, page_title) -> Page | None:
         """Get a reference to a page given the page title.
@@ -121,44 +199,211 @@ class Namespace:
             page_title (str): The page title (case sensitive)
         """
         
-        # TODO shouldn't this use self.index ???
-        
-        for page in self.pages:
-            if page.title == page_title:
-                return page
-            
-            if page_title in page.alias:
-                return page
-
-        # if still here try aliases
-        # TODO this will not be a list, alias is a string
-        # for page in page.alias:
-        #     if page.alias == page_title:
-        #         return page
-            
-        return None
+        return self.index.get_page(page_title)
 
     def process_pages(self) -> None:
         """Process each page, first processing any embedded directives,
         then outputting the result to the namespace's target.
         """
 
+        profiler = self.wiki.profiler
+
         # so don't need that conf option
         if self.config.toc > 0:
-            self.generate_stories()
-            self.generate_story_tocs()
-            self.generate_ns_toc()
-            self.update_story_links()
+            with profiler.phase('toc', self.name):
+                self.generate_stories()
+                self.generate_story_tocs()
+                self.generate_ns_toc()
+                self.update_story_links()
 
-        for page in self.pages:
-            page.process_directives()
-            page.save()
+        self.tags_cache.clear()
+
+        # in stream mode pages only keep the metadata that other pages are likely to need
+        keep_meta = self.stream_meta_fields() if self.config.stream else None
+
+        # in incremental mode pages are only rendered if they have changed, or their output is missing
+        manifest = self.wiki.manifest
+        outputs = self.scan_dir(Path(self.config.target_dir)) if manifest.enabled else None
+        unchanged = 0
+
+        # rendered pages kept between builds
+        cache = self.wiki.render_cache
+        cached = 0
+
+        # with io_workers pages are written while the following pages are rendered
+        with FileWriter(self.config.io_workers) as writer:
+            for page in self.pages:
+                key = self.page_keys.get(page.source)
+                target = Path(self.config.target_dir) / Path(page.target).with_suffix('.md')
+
+                stages = self.page_stages(key) if key else set()
+
+                if key and target.name in outputs and manifest.unchanged(key, stages):
+                    unchanged += 1
+                    page.release(keep_meta)
+                    continue
+
+                # large pages are not cached, as that would mean reading all of them into memory
+                if key and cache.enabled and not page.mapped:
+                    with profiler.phase('cache', self.name):
+                        record = self.save_cached(page, key, stages, target, writer)
+
+                    if record is not None:
+                        cached += 1
+                        manifest.add_page(key, stages, bool(record['files'] or record['dirs']))
+                        page.release(keep_meta)
+                        continue
+
+                    self.render_deps = RenderDeps()
+
+                dependent = page.has_dependencies() if key else False
+
+                with profiler.phase('render', self.name, page=page.source):
+                    page.process_directives()
+
+                with profiler.phase('save', self.name):
+                    page.save(writer=writer)
+
+                    if self.render_deps is not None:
+                        self.cache_page(page, key, stages)
+
+                if key:
+                    manifest.add_page(key, stages, dependent)
+
+                page.release(keep_meta)
+
+            with profiler.phase('save', self.name):
+                writer.close()
+
+        if manifest.incremental:
+            logging.info(f"{unchanged} of {len(self.pages)} pages in namespace '{self.name}' are unchanged")
+
+        if cache.enabled:
+            logging.info(f"{cached} of {len(self.pages)} pages in namespace '{self.name}' are from the render cache")
 
         if self.config.search_fields:
-            self.index.export_search_index()
+            with profiler.phase('search', self.name):
+                self.index.export_search_index()
 
         logging.debug(f"processed namespace '{self.name}'")
 
+    def file_key(self, path: Path) -> str:
+        """Return the name of a file in the build manifest, which is its path
+        relative to the content dir that contains it (or the first content dir),
+        so that it does not depend on where the wiki is.
+        """
+        path = Path(os.path.normpath(path))
+
+        for n, content_dir in enumerate(self.config.content_dirs):
+            try:
+                return f"{self.name}/{n}/{path.relative_to(os.path.normpath(content_dir)).as_posix()}"
+            except ValueError:
+                continue
+
+        return f"{self.name}/-/{Path(os.path.relpath(path, self.config.content_dirs[0])).as_posix()}"
+
+    def page_stages(self, key: str) -> set[str]:
+        """Return the stages of the build whose options a page depends on, see
+        Manifest.page_stages(). Story links are added to pages' metadata when
+        the ToC is generated, so then every page depends on the 'links' stage.
+        """
+        stages = self.wiki.manifest.page_stages(key)
+
+        if self.config.toc > 0:
+            stages.add('links')
+
+        return stages
+
+    def render_key(self, key: str, stages: set[str]) -> str:
+        """Return the key of a page in the render cache, given its key in the manifest."""
+
+        manifest = self.wiki.manifest
+
+        return hash_data([manifest.files[key]['hash'], manifest.index, manifest.page_config(stages)])
+
+    def output_key(self, page: Page, render_key: str, record: dict) -> str | None:
+        """Return the key of a page's output in the render cache, from the current
+        hashes of the files and directory listings it depends on. As directives
+        in included files are processed by the page, the options of the stages
+        used by those files are included too. Returns None if any of the files
+        are missing.
+        """
+        manifest = self.wiki.manifest
+        page_dir = Path(page.source).parent
+        files = []
+        stages = set()
+
+        for file_name in record['files']:
+            path = page_dir / file_name
+            key = self.file_key(path)
+
+            try:
+                files.append(manifest.file_hash(key, path, self.stat_file(path)))
+            except OSError:
+                return None
+
+            stages.update(manifest.page_stages(key))
+
+        dirs = [hash_data(sorted(self.scan_dir(page_dir / d).entries)) for d in record['dirs']]
+
+        return hash_data([render_key, record, files, dirs, manifest.page_config(stages)])
+
+    def save_cached(self, page: Page, key: str, stages: set[str], target: Path, writer: FileWriter) -> dict | None:
+        """Save a page from the render cache, if it is there, returning the
+        record of its dependencies. Otherwise return None.
+        """
+        cache = self.wiki.render_cache
+        render_key = self.render_key(key, stages)
+
+        record = cache.get_record(render_key)
+
+        if record is None:
+            return None
+
+        output_key = self.output_key(page, render_key, record)
+        text = cache.get(output_key) if output_key else None
+
+        if text is None:
+            return None
+
+        writer.write(target, text)
+
+        return record
+
+    def cache_page(self, page: Page, key: str, stages: set[str]) -> None:
+        """Save a page that has just been rendered to the render cache, unless
+        it had exec directives.
+        """
+        deps, self.render_deps = self.render_deps, None
+
+        if deps.volatile:
+            return
+
+        page_dir = Path(page.source).parent
+
+        record = {
+            'files': sorted(Path(os.path.relpath(f, page_dir)).as_posix() for f in deps.files),
+            'dirs': sorted(Path(os.path.relpath(d, page_dir)).as_posix() for d in deps.dirs)
+        }
+
+        render_key = self.render_key(key, stages)
+        output_key = self.output_key(page, render_key, record)
+
+        if output_key:
+            self.wiki.render_cache.put(render_key, record, output_key, page.header(), page.body)
+
+    def stream_meta_fields(self) -> list[str]:
+        """The metadata fields that are kept once a page has been saved in stream
+        mode, i.e. those used for page links, tag lists, the ToC and the metadata
+        indexes. Any other fields are re-read from the page's file if needed (e.g.
+        by a tag directive with a format template).
+        """
+        fields = ['title', 'alias', 'page_title', 'tags', 'noindex', 'toc-level', 'toc-include', 'toc-display', 'toc-order']
+        fields.extend(self.config.meta_links)
+        fields.extend(f.split('.')[0] for f in self.config.meta_indexes)
+
+        return list(dict.fromkeys(fields))
+
     def report_broken_links(self) -> None:
         """Report broken links. If the verbose level is set
         to 3 then report broken links.
@@ -6,7 +6,6 @@ import yaml
 import glob
 from pathlib import Path
 import argparse
-import subprocess
 from string import Template
 from typing import TYPE_CHECKING
 from functools import partial
@@ -14,8 +13,13 @@ from functools import partial
 if TYPE_CHECKING:
     from mokuwiki.namespace import Namespace
 
+from mokuwiki.execute import EXEC_CALLABLE_PREFIX, CallableRegistry, run_command
+from mokuwiki.fileio import PageHead, FileWriter, find_directive_lines, find_meta_end, map_file, read_head, split_spans, strip_span
+from mokuwiki.fileio import write_file, write_segments
+from mokuwiki.profiler import DISABLED_PROFILER, Profiler
+from mokuwiki.query import QueryError, chain_head, split_namespace
 from mokuwiki.utils import FileIncludeParser, ImageIncludeParser, TagListParser
-from mokuwiki.utils import make_file_name, make_image_link, make_markdown_link, make_wiki_link, make_markdown_span
+from mokuwiki.utils import make_file_name, make_image_link, make_markdown_link, make_wiki_link, make_markdown_span, split_options, load_yaml
 
 
 import logging
@@ -31,12 +35,31 @@ PAGE_LINK_RE = r"\[\[(.*?)\]\]"
 IMAGE_LINK_RE = r"!!(.*?)!!"
 CUSTOM_STYLE_RE = r"\^\^(.*?)\^\^"
 
+# directives whose output depends on other files or commands
+DEPENDENCY_RE = re.compile(f"{FILE_INCLUDE_RE}|{EXEC_COMMAND_RE}")
+DEPENDENCY_BYTES_RE = re.compile(DEPENDENCY_RE.pattern.encode('utf8'))
+
+# the end of the metadata block is a line containing only '...' (and whitespace)
+META_END_RE = re.compile(r"^[ \t]*\.\.\.[ \t]*$", re.MULTILINE)
+
 MIN_REPEAT_COUNT = 1
 MAX_REPEAT_COUNT = 999
 MIN_HEADING_LEVEL = 1
 MAX_HEADING_LEVEL = 6
 
 
+def _decode(data: bytes) -> str:
+    """Decode part of a file read in binary mode, with newlines translated
+    as if it had been read in text mode.
+    """
+    text = data.decode('utf8')
+
+    if '\r' in text:
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+
+    return text
+
+
 class MetadataReplace(Template):
     """Subclass of Template to allow for different template character.
     """
@@ -57,7 +80,13 @@ class Page:
     ImageIncludeParser = ImageIncludeParser()
     TagListParser = TagListParser()
 
-    def __init__(self, page_path: Path | str, namespace: 'Namespace', included: bool = False, media: str = 'images', custom: str = '.smallcaps') -> None:
+    # for single file mode, only has callables from installed packages
+    Callables = CallableRegistry()
+
+    # there can be a lot of pages, so don't give each one a __dict__
+    __slots__ = ('_meta', '_partial', '_body', '_offset', '_segments', '_size', 'target', 'source', 'namespace', 'modified', '_media', '_custom', '_lazy')
+
+    def __init__(self, page_path: Path | str, namespace: 'Namespace', included: bool = False, media: str = 'images', custom: str = '.smallcaps', head: PageHead | None = None, stat: os.stat_result | None = None) -> None:
         """Initialize a Page object by reading a Markdown file and
         splitting the contents into metadata and body components.
 
@@ -79,71 +108,255 @@ class Page:
             custom (str, optional): When used in "single file mode"
             used to override the CSS used for the custom style. Defaults to
             '.smallcaps'.
+            head (PageHead, optional): The stat and metadata of the page's file if
+            they have already been read, see read_head(). Defaults to None.
+            stat (os.stat_result, optional): The stat of the page's file if it
+            is already known, e.g. from a directory scan. Defaults to None.
         """
         # TODO included should really be inc_meta=False or similar
         # file name might be empty
         if not page_path:
             raise ValueError
 
-        # read file
-        # TODO should be in self.load(), returns (meta, body)
+        self.source = page_path        
+        self.namespace = namespace
+
+        try:
+            if stat is None:
+                stat = head.stat if head else Path(page_path).stat()
+        except OSError:
+            logging.error(f"could not read file '{page_path}'")
+            raise ValueError
+
+        self._size = stat.st_size
+
+        # pages in a namespace only read their metadata until they are rendered,
+        # included pages (and single file mode) are used straight away
+        self._lazy = namespace is not None and not included
+        self._offset = None
+        self._segments = None
+
+        if self._lazy:
+            meta = self.load_meta(head)
+            self._body = None
+        else:
+            meta, self._body = self.load(included)
+
+        self.meta = self.parse_meta(meta)
+
         try:
-            with Path(page_path).open('r', encoding='utf8') as f:
+            self.target = make_file_name(self.meta['title'])
+        except KeyError:
+            # included files do not need a target, as they will never be saved
+            if included:
+                self.target = None
+            else:
+                raise ValueError(f"page {page_path} has no title")
+
+        # mainly for single file mode
+        # TODO only set if namesapce == none? is that right?
+        self._media = media
+        self._custom = custom
+
+        self.modified = stat.st_mtime
+
+        logging.debug(f"created page '{self.source}'")
+
+    def load(self, included: bool = False) -> tuple[str, str]:
+        """Read the page's file and split it into the metadata (as a YAML string)
+        and the body.
+
+        Args:
+            included (bool, optional): If true then files without metadata are
+            allowed. Defaults to False.
+        """
+        try:
+            with Path(self.source).open('r', encoding='utf8') as f:
                 contents = f.read().strip()
         except IOError:
-            logging.error(f"could not read file '{page_path}'")
+            logging.error(f"could not read file '{self.source}'")
             raise ValueError
         
-        if '...' in contents:
-            self.meta, _, self.body = contents.partition('...')
+        meta_end = META_END_RE.search(contents)
+
+        if meta_end:
+            meta, body = contents[:meta_end.start()], contents[meta_end.end():]
         else:
             if included:
                 # if the page is being created as part of an include directive, plain files
                 # with missing metadata are allowed
-                self.meta = {}
-                self.body = contents
+                meta, body = '', contents
             else:
-                logging.warning(f"incorrect metadata specification in '{page_path}'")
+                logging.warning(f"incorrect metadata specification in '{self.source}'")
                 raise ValueError
 
-        self.body = self.body.strip()
+        return meta, body.strip()
 
-        if self.meta:
+    def load_meta(self, head: PageHead | None = None) -> str:
+        """Read only the metadata block from the page's file, i.e. up to the
+        line '...', and note where the body starts so it can be read later.
+        If the metadata block has already been read then use that.
+        """
+        if head is None and self.mapped:
             try:
-                self.meta = yaml.safe_load(self.meta)
-            except yaml.YAMLError:
-                logging.warning(f"error in metadata for '{page_path}'")
+                with map_file(self.source) as buffer:
+                    meta_end = find_meta_end(buffer)
+
+                    if meta_end:
+                        self._offset = meta_end[1]
+                        return _decode(buffer[:meta_end[0]])
+            except IOError:
+                logging.error(f"could not read file '{self.source}'")
                 raise ValueError
 
+            logging.warning(f"incorrect metadata specification in '{self.source}'")
+            raise ValueError
+
+        if head is None:
+            head = read_head(self.source)
+
+        if head is None:
+            logging.error(f"could not read file '{self.source}'")
+            raise ValueError
+
+        if head.meta is None:
+            logging.warning(f"incorrect metadata specification in '{self.source}'")
+            raise ValueError
+
+        self._offset = head.offset
+
+        return _decode(head.meta)
+
+    def load_body(self) -> str:
+        """Read the body from the page's file."""
+
+        if self._offset is None:
+            return self.load()[1]
+
         try:
-            self.target = make_file_name(self.meta['title'])
-        except KeyError:
-            # included files do not need a target, as they will never be saved
-            if included:
-                self.target = None
-            else:
-                raise ValueError(f"page {page_path} has no title")
-                
-        self.source = page_path        
-        self.namespace = namespace
+            with Path(self.source).open('rb') as f:
+                f.seek(self._offset)
+                return _decode(f.read()).strip()
+        except IOError:
+            logging.error(f"could not read file '{self.source}'")
+            raise ValueError
+
+    def parse_meta(self, meta: str) -> dict:
+        """Parse the metadata read by load(), removing any noise tags.
+        """
+        if not meta:
+            return {}
+
+        try:
+            meta = load_yaml(meta, self.namespace.config.yaml_loader) if self.namespace is not None else load_yaml(meta)
+        except yaml.YAMLError:
+            logging.warning(f"error in metadata for '{self.source}'")
+            raise ValueError
 
         # remove 'noise' tags for wiki
         # TODO why remove noise tags? also assumes is a list? 
         # TODO this is removing from page not just index?
         if self.namespace:
-            if 'tags' in self.meta and self.namespace.config.noise_tags:
+            if 'tags' in meta and self.namespace.config.noise_tags:
                 for tag in self.namespace.config.noise_tags:
-                    if tag in self.meta['tags']:
-                        self.meta['tags'].remove(tag)
+                    if tag in meta['tags']:
+                        meta['tags'].remove(tag)
 
-        # mainly for single file mode
-        # TODO only set if namesapce == none? is that right?
-        self._media = media
-        self._custom = custom
+        return meta
+
+    @property
+    def meta(self) -> dict:
+        """The metadata of the page. If only some fields have been kept (see
+        release()) then the rest are read from the page's file again.
+        """
+        if self._partial:
+            try:
+                meta = self.parse_meta(self.load_meta())
+            except ValueError:
+                meta = {}
 
-        self.modified = page_path.stat().st_mtime
+            # fields that were kept may have been changed, e.g. story links
+            meta.update(self._meta)
 
-        logging.debug(f"created page '{self.source}'")
+            self._meta = meta
+            self._partial = False
+
+        return self._meta
+
+    @meta.setter
+    def meta(self, meta: dict) -> None:
+        self._meta = meta
+        self._partial = False
+
+    @property
+    def body(self) -> str:
+        """The body of the page. This is read from the page's file when it is
+        first needed, and again if it has been released.
+        """
+        if self._segments is not None:
+            # a large page that has been processed, see process_mapped()
+            try:
+                with map_file(self.source) as buffer:
+                    self._body = ''.join(s if isinstance(s, str) else _decode(buffer[s[0]:s[1]]) for s in self._segments)
+            except IOError:
+                logging.error(f"could not read file '{self.source}'")
+                self._body = ''
+
+            self._segments = None
+
+        if self._body is None:
+            try:
+                self._body = self.load_body()
+            except ValueError:
+                self._body = ''
+
+        return self._body
+
+    @body.setter
+    def body(self, body: str) -> None:
+        self._body = body
+        self._segments = None
+
+    @property
+    def mapped(self) -> bool:
+        """True if the page is large enough to be read using a memory map."""
+
+        if not self._lazy:
+            return False
+
+        threshold = self.namespace.config.mmap_threshold
+
+        return threshold > 0 and self._size >= threshold
+
+    def release(self, keep_meta: list[str] | None = None) -> None:
+        """Release the body of the page to save memory, e.g. after it has been
+        saved. Note that if the body is needed again it is re-read from the
+        page's file, so any changes made by directives are lost.
+
+        Args:
+            keep_meta (list, optional): If given then only these metadata
+            fields are kept as well. Defaults to None.
+        """
+        if not self._lazy:
+            return
+
+        self._body = None
+        self._segments = None
+
+        if keep_meta is not None and not self._partial:
+            self._meta = {f: self._meta[f] for f in keep_meta if f in self._meta}
+            self._partial = True
+
+    def __getstate__(self) -> dict:
+        # pages are sent between processes without their namespace (which refers
+        # to the whole wiki), the receiving process sets it again
+        return {s: getattr(self, s) for s in self.__slots__ if s != 'namespace' and hasattr(self, s)}
+
+    def __setstate__(self, state: dict) -> None:
+        self.namespace = None
+
+        for name, value in state.items():
+            setattr(self, name, value)
 
     def __str__(self) -> str:
         """The string representation of a page is simply the metadata
@@ -156,7 +369,7 @@ class Page:
 
         # return '\n'.join('---', yaml.safe_dump(self.meta, default_flow_style=False), '...', self.body)
 
-        return '---\n' + yaml.safe_dump(self.meta, default_flow_style=False) + '...\n' + self.body
+        return self.header() + self.body
 
     # TODO should we have a predetermined file_name (with html ext) and have ns.get_page() return a link as well or get_link(pagr)?
 
@@ -203,6 +416,10 @@ class Page:
     def noindex(self) -> bool:
         return self.meta.get('noindex', False)
 
+    @property
+    def profiler(self) -> Profiler:
+        return self.namespace.wiki.profiler if self.namespace else DISABLED_PROFILER
+
     @property
     def media_dir(self) -> str:
         # for mwpage...
@@ -248,13 +465,17 @@ class Page:
 
         return content
 
-    def save(self, file_name: str = None) -> None:
-        """Save a page to a file. This uses the string representation.
+    def save(self, file_name: str = None, writer: FileWriter | None = None) -> None:
+        """Save a page to a file, i.e. its string representation, writing the
+        metadata and the body separately.
 
         Args:
             file_name (FileType, optional): A file name to override the
             default one (which is a slugified version of the page title).
             Defaults to None.
+            writer (FileWriter, optional): If given then the page is written
+            by the writer (large pages as well), and may not have been written
+            when save() returns. Defaults to None.
         """
 
         if not self.target:
@@ -267,11 +488,29 @@ class Page:
             file_name = Path(target_dir) / self.target
             file_name = file_name.with_suffix('.md')
 
-        try:
-            with file_name.open('w', encoding='utf8') as f:
-                f.write(str(self))
-        except IOError:
-            logging.error(f"could not write output file '{file_name}'")
+        if self._segments is not None:
+            self.save_mapped(file_name, writer)
+            return
+
+        # write the parts separately, rather than making a copy of the page
+        if writer is not None:
+            writer.write(file_name, self.header(), self.body)
+        else:
+            write_file(file_name, self.header(), self.body)
+
+    def save_mapped(self, file_name: Path | str, writer: FileWriter | None = None) -> None:
+        """Save a page processed by process_mapped(), copying the unchanged
+        parts of the body directly from the page's file.
+        """
+        if writer is not None:
+            writer.submit(write_segments, file_name, self.header(), self.source, self._segments)
+        else:
+            write_segments(file_name, self.header(), self.source, self._segments)
+
+    def header(self) -> str:
+        """The page's metadata as a YAML block, as it starts the saved page."""
+
+        return '---\n' + yaml.safe_dump(self.meta, default_flow_style=False) + '...\n'
 
     def process_directives(self) -> None:
         """Process the various directives that may be embedded in the page.
@@ -284,31 +523,69 @@ class Page:
         would mean a possible infinite file inclusion issue.
         """
 
+        if self._body is None and self._segments is None and self.mapped:
+            self._segments = self.process_mapped()
+
+        if self._segments is None:
+            self.body = self.process_body(self.body)
+
+        # these directives are not relevant in single file mode (i.e. when namespace == None)
+        if self.namespace:
+            # convert metadata into links
+            self.convert_metadata_links()
+
+    def process_body(self, body: str) -> str:
+        """Process the directives in the body (or part of the body) of the page.
+        """
+
+        # directive handlers are only wrapped if profiling is enabled
+        timed = self.profiler.timed
+
         # remove comments
-        self.body = re.sub(COMMENT_RE, '', self.body, flags=re.MULTILINE)
+        body = re.sub(COMMENT_RE, timed('comment', ''), body, flags=re.MULTILINE)
 
         # process file includes
-        self.body = re.sub(FILE_INCLUDE_RE, self.process_file_includes, self.body)
+        body = re.sub(FILE_INCLUDE_RE, timed('include', self.process_file_includes), body)
 
         # process exec commands
-        self.body = re.sub(EXEC_COMMAND_RE, self.process_exec_command, self.body)
+        body = re.sub(EXEC_COMMAND_RE, timed('exec', self.process_exec_command), body)
 
         # these directives are not relevant in single file mode (i.e. when namespace == None)
         if self.namespace:
             # process tag directives
-            self.body = re.sub(TAGS_REPLACE_RE, self.process_tags_directive, self.body)
+            body = re.sub(TAGS_REPLACE_RE, timed('tags', self.process_tags_directive), body)
             
             # process page links
-            self.body = re.sub(PAGE_LINK_RE, self.process_link_directives, self.body)
-
-            # convert metadata into links
-            self.convert_metadata_links()
+            body = re.sub(PAGE_LINK_RE, timed('link', self.process_link_directives), body)
 
         # process image links
-        self.body = re.sub(IMAGE_LINK_RE, self.process_image_links, self.body)
+        body = re.sub(IMAGE_LINK_RE, timed('image', self.process_image_links), body)
 
         # process custom style
-        self.body = re.sub(CUSTOM_STYLE_RE, self.process_custom_style, self.body)
+        body = re.sub(CUSTOM_STYLE_RE, timed('custom', self.process_custom_style), body)
+
+        return body
+
+    def process_mapped(self) -> list | None:
+        """Process the directives in a large page using a memory map of its file.
+        As directives do not span lines, only the lines that might contain a
+        directive are decoded and processed. The result is a list of processed
+        strings and (start, end) offsets of unchanged parts of the file, which
+        are copied when the page is saved. Returns None if the page has to be
+        processed as a string.
+        """
+        try:
+            with map_file(self.source) as buffer:
+                start, end = strip_span(buffer, self._offset, len(buffer))
+
+                # newlines would need translating
+                if buffer.find(b'\r', start, end) != -1:
+                    return None
+
+                return [self.process_body(_decode(buffer[s:e])) if directives else (s, e)
+                        for s, e, directives in split_spans(start, end, find_directive_lines(buffer, start, end))]
+        except IOError:
+            return None
 
     def convert_metadata_links(self) -> None:
         """Convert specified metadata fields into links.
@@ -379,6 +656,9 @@ class Page:
 
         page_list = []
 
+        # the render cache needs to know which files and directories the output depends on
+        deps = self.namespace.render_deps if self.namespace is not None else None
+
         # resolve namespace ref if present
         # TODO replace 'ns1:' with path to content, then glob? this would allow ns1:file*.md?
         if ':' in options.files:
@@ -392,12 +672,22 @@ class Page:
         elif '/' in options.files:
             # this is a path spec relative to the including file
             content_dir = Path(self.source).parent / Path(options.files).parent
-            page_list = list(content_dir.glob(Path(options.files).name))
+
+            page_list = self.glob_files(content_dir, Path(options.files).name)
+
+            if deps is not None:
+                deps.dirs.add(content_dir)
         
         else:
             # assume this is a file(s) in one of the content_dirs
             for content_dir in self.namespace.config.content_dirs:
-                page_list.extend(list(content_dir.glob(options.files)))
+                page_list.extend(self.glob_files(content_dir, options.files))
+
+                if deps is not None:
+                    deps.dirs.add(content_dir)
+
+        if deps is not None:
+            deps.files.update(page_list)
                 
         # create text
         if len(page_list) == 0:
@@ -416,11 +706,11 @@ class Page:
         try:
             if options.format:
                 # create list of Page objects from paths
-                page_list = [Page(p, self.namespace, included=True) for p in page_list]
+                page_list = [self.include_page(p) for p in page_list]
 
                 incl_text = [MetadataReplace(options.format).safe_substitute(p.meta) for p in page_list]
             else:
-                incl_text = [Page(p, self.namespace, included=True).content(options.indent, options.shift) for p in page_list]
+                incl_text = [self.include_page(p).content(options.indent, options.shift) for p in page_list]
 
         except ValueError:
             # catch Page() errors due to path issues
@@ -434,9 +724,31 @@ class Page:
 
         return options.header + incl_text
 
+    def glob_files(self, directory: Path, pattern: str) -> list[Path]:
+        """Return the files in a directory that match a pattern. In a namespace
+        the directory is only scanned once, see Namespace.scan_dir().
+        """
+        if self.namespace is None:
+            return list(directory.glob(pattern))
+
+        return self.namespace.scan_dir(directory).glob(pattern)
+
+    def include_page(self, path: Path) -> 'Page':
+        """Create a Page for an included file, using the stat from the scan of
+        its directory if there is one.
+        """
+        stat = self.namespace.stat_file(path) if self.namespace is not None else None
+
+        return Page(path, self.namespace, included=True, stat=stat)
+
     def process_exec_command(self, command: Match) -> str:
         """Execute a shell command and return the output as a string for inclusion
-        into another file.
+        into another file. Outside of single file mode the output is cached by the
+        wiki, so identical commands are only run once.
+
+        If the command starts with 'py:' (e.g. `%% py:report level=3 %%`) then the
+        Python function registered as 'report' is called instead, with the rest of the
+        directive and the page's metadata.
 
         Args:
             command (Match): A Match object corresponding to a shell command
@@ -447,10 +759,57 @@ class Page:
 
         cmd_args = str(command.group(1))
 
-        # TODO try/except; esacpe with shlex?
-        cmd_output = subprocess.run(cmd_args, shell=True, capture_output=True, universal_newlines=True, encoding='utf-8')
+        # the output of commands cannot be cached
+        if self.namespace is not None and self.namespace.render_deps is not None:
+            self.namespace.render_deps.volatile = True
+
+        if cmd_args.strip().startswith(EXEC_CALLABLE_PREFIX):
+            callables = self.namespace.wiki.callables if self.namespace else Page.Callables
+            return callables.call(cmd_args, self.meta, self.source)
 
-        return cmd_output.stdout
+        if self.namespace:
+            return self.namespace.wiki.exec_cache.run(cmd_args, self.source)
+
+        return run_command(cmd_args).stdout
+
+    def has_dependencies(self) -> bool:
+        """Return True if the page has include or exec directives, i.e. its output
+        depends on other files or commands as well as its own file and the index.
+        """
+        if self._body is None and self._segments is None and self.mapped:
+            try:
+                with map_file(self.source) as buffer:
+                    return DEPENDENCY_BYTES_RE.search(buffer, self._offset) is not None
+            except IOError:
+                return True
+
+        return DEPENDENCY_RE.search(self.body) is not None
+
+    def get_exec_commands(self) -> list[str]:
+        """Return the commands in the page's exec directives, ignoring any in comments
+        and calls to Python functions. The body is not kept if it had not been
+        read yet, e.g. when exec commands are run before any pages are rendered.
+        For large pages only the lines that might contain directives are read,
+        see process_mapped().
+        """
+        if self._body is not None:
+            body = self._body
+        elif self.mapped:
+            try:
+                with map_file(self.source) as buffer:
+                    start, end = strip_span(buffer, self._offset, len(buffer))
+                    body = '\n'.join(_decode(buffer[s:e]) for s, e in find_directive_lines(buffer, start, end))
+            except IOError:
+                return []
+        else:
+            try:
+                body = self.load_body()
+            except ValueError:
+                return []
+
+        commands = re.findall(EXEC_COMMAND_RE, re.sub(COMMENT_RE, '', body, flags=re.MULTILINE))
+
+        return [c for c in commands if not c.strip().startswith(EXEC_CALLABLE_PREFIX)]
 
     def process_tags_directive(self, tags: Match) -> str:
         """Convert a tag specification into a string containing inter-page links to
@@ -466,11 +825,17 @@ class Page:
         -  `{{#}}`: return the total number of pages in the namespace, as an int
         -  `{{#tag}}`: return the number of pages with 'tag', as an int
 
+        Tags can also be grouped and combined with metadata comparisons, e.g.
+        `{{(tag1 OR tag2) AND NOT tag3 &level>3}}`, see mokuwiki.query for details.
+
         Note that in returned lists each link is separated by a blank line.
         
         If the first tag starts with a namespace alias (e.g. {{ns2:tag1}}) then this
         processing will act on that namespace's tags, generating relevant links. Subsequent
-        tags should NOT start with a namespace alias.
+        tags should NOT start with a different namespace alias.
+
+        The result depends only on the directive and the namespace it is used in, so
+        it is cached in the namespace and re-used for identical directives on other pages.
 
         Args:
             tags (Match): A match object corresponding to a tag specification
@@ -481,6 +846,19 @@ class Page:
         """
         
         tag_list = str(tags.group(1))
+
+        # normalise the directive, ignoring whitespace between arguments. The first
+        # argument says whether the tags are from this namespace or another one
+        tag_args = tuple(split_options(tag_list))
+        cache_key = (bool(tag_args) and ':' not in tag_args[0], tag_args)
+
+        if cache_key not in self.namespace.tags_cache:
+            self.namespace.tags_cache[cache_key] = self._render_tags_directive(tag_list)
+
+        return self.namespace.tags_cache[cache_key]
+
+    def _render_tags_directive(self, tag_list: str) -> str:
+
         options = Page.TagListParser.parse(tag_list)
 
         # replace format. header if in template, else retain
@@ -490,83 +868,70 @@ class Page:
         if options.header:
             options.header = self.namespace.config.templates.get(options.header, options.header)
 
-        tag_list = options.tags
-
-        # get initial category
-        tag_name = tag_list[0]
+        # a leading namespace qualifier applies to the whole query
+        ns_alias, query = split_namespace(' '.join(options.tags))
         tag_text = ''
 
         # TODO if using format, then tag_text are the things that will go in there
         # default format is '' which means make, format does not apply to #, @ etc
 
-        own_ns = False if ':' in tag_name else True
+        own_ns = False if ns_alias else True
         
         if own_ns:
             tag_ns = self.namespace
         else:
             # tag in a different namespace
-            tag_ns, _, tag_name = tag_name.partition(':')
-            
-            tag_ns = self.namespace.wiki.get_namespace(tag_ns)
+            tag_ns = self.namespace.wiki.get_namespace(ns_alias)
             
             if not tag_ns:
                 return tag_text
 
-        if tag_name == '*':
+        if query == '*':
             tag_text = [make_wiki_link(t, tag_ns.name) for t in tag_ns.index.get_titles()]
 
-        elif tag_name == '@':
+        elif query == '@':
             tag_text = [make_markdown_span(t, tag_ns.config.tags_css) for t in tag_ns.index.get_tags()]
 
-        elif tag_name.startswith('#'):
+        elif query.startswith('#'):
 
-            if tag_name == '#':
+            if query == '#':
                 tag_text = str(len(list(tag_ns.index.get_titles())))
             else:
-                tag_text = str(len(tag_ns.index.get_tagged_pages(tag_name[1:])))
+                tag_text = str(len(self._query_tags(tag_ns, query[1:])))
             
-        elif tag_ns.index.has_tag(tag_name):
-                # copy first tag set, which must exist
-                # THIS returns page.title... NEEDS to be page so can get meta for format
-                page_set = tag_ns.index.get_tagged_pages(tag_name)
-
-                # add/del/combine other tagged categories
-                for tag in tag_list[1:]:
-
-                    tag_name = tag[1:] if tag.startswith(('&', '!')) else tag
-
-                    # normalise tag name
-                    # tag_name = tag_name.lower()
+        elif (first_tag := chain_head(query)) is not None and not tag_ns.index.has_tag(first_tag):
+            # in the original syntax the first tag must exist, otherwise there are no pages
+            # (but unlike an empty result --before and --after are still used)
+            pass
 
-                    if tag[0] == '&':
-                        page_set = page_set & tag_ns.index.get_tagged_pages(tag_name)
-                    elif tag[0] == '!':
-                        page_set = page_set - tag_ns.index.get_tagged_pages(tag_name)
-                    else:
-                        page_set = page_set | tag_ns.index.get_tagged_pages(tag_name)
+        else:
+            # THIS returns page.title... NEEDS to be page so can get meta for format
+            page_set = self._query_tags(tag_ns, query)
 
-                ns_name = '' if own_ns else tag_ns.name
-                
-                if not options.format:
-                    # TODO can't we just make a wiki link, as will be processed next?
-                    tag_text = [make_markdown_link(p, '', ns_name) for p in page_set]
-                else:
-                    # turn titles back into pages
-                    page_set = [tag_ns.get_page(p) for p in page_set]
+            if options.sort_by:
+                # sort using the metadata index, the output is not sorted again
+                page_set = tag_ns.index.sort_titles(page_set, options.sort_by, options.reverse)
+                options.sort = False
 
-                    # TODO needs to be aware of nested properties like item.cost unless we expand out locally
-                    # TODO ... maybe create meta terms like 'item.cost' locally
-                    tag_text = [MetadataReplace(options.format).safe_substitute(p.meta) for p in page_set]
+            ns_name = '' if own_ns else tag_ns.name
+            
+            if not options.format:
+                # TODO can't we just make a wiki link, as will be processed next?
+                tag_text = [make_markdown_link(p, '', ns_name) for p in page_set]
+            else:
+                # turn titles back into pages
+                page_set = [tag_ns.index.get_page(p) for p in page_set]
 
-        else:
-            pass
+                # TODO needs to be aware of nested properties like item.cost unless we expand out locally
+                # TODO ... maybe create meta terms like 'item.cost' locally
+                tag_text = [MetadataReplace(options.format).safe_substitute(p.meta) for p in page_set]
                         
         if isinstance(tag_text, str):
             tag_text = options.before + tag_text + options.after
         else:
             if options.sort:
                 # sort by content (e.g. title)
-                tag_text = sorted(tag_text)
+                tag_text = sorted(tag_text, reverse=options.reverse)
             
             tag_text = options.sep.join([options.before + 
                                          t + 
@@ -575,6 +940,16 @@ class Page:
         
         return options.header + tag_text
 
+    def _query_tags(self, tag_ns: 'Namespace', query: str) -> list[str]:
+        """Return the titles of pages in the namespace matching a tag query. Errors
+        in the query are reported and no pages are returned.
+        """
+        try:
+            return tag_ns.index.query(query)
+        except QueryError as e:
+            logging.error(f"{e} in '{self.source}'")
+            return []
+
     def process_link_directives(self, page: Match, show_broken = True) -> str:
         """Convert a page title in double square brackets into an inter-page link.
         Typically this will be `[[Page name]]` or `[[Display name|Page name]]`,
@@ -0,0 +1,240 @@
+"""Timing of the phases of a wiki build and of the directives in each page.
+"""
+import json
+import time
+from pathlib import Path
+from contextlib import nullcontext
+from collections import defaultdict
+
+# phases in the order they happen, for the summary
+PHASES = ['preprocess', 'load', 'index', 'exec', 'toc', 'cache', 'render', 'save', 'search', 'postprocess']
+
+
+class _Timer:
+    """Context manager that records the time spent in a phase. Time spent in any
+    phases nested inside this one is only counted in the nested phase.
+    """
+
+    def __init__(self, profiler: 'Profiler', phase: str, namespace: str, page: str = '') -> None:
+        self.profiler = profiler
+        self.key = (namespace, phase)
+        self.page = page
+
+    def __enter__(self) -> '_Timer':
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+        self.child_wall = self.child_cpu = 0.0
+
+        self.profiler._stack.append(self)
+
+        if self.page:
+            self.profiler._page = self.profiler.pages[self.page]
+            self.profiler._page['namespace'] = self.key[0]
+
+        return self
+
+    def __exit__(self, *args) -> None:
+        wall = time.perf_counter() - self.wall
+        cpu = time.process_time() - self.cpu
+
+        self.profiler._stack.pop()
+
+        if self.profiler._stack:
+            parent = self.profiler._stack[-1]
+            parent.child_wall += wall
+            parent.child_cpu += cpu
+
+        totals = self.profiler.phases[self.key]
+        totals['wall'] += wall - self.child_wall
+        totals['cpu'] += cpu - self.child_cpu
+        totals['count'] += 1
+
+        if self.page:
+            self.profiler._page['wall'] += wall
+            self.profiler._page = None
+
+
+class Profiler:
+    """Records the wall clock and CPU time of each phase of a build, per namespace,
+    and the number of and time taken by each type of directive. Directives are
+    also counted and timed for each page, so that the slowest pages (and the
+    directives that made them slow) can be reported. If not enabled (the default)
+    then nothing is recorded and there is almost no overhead.
+
+    Usage:
+
+        with profiler.phase('load', 'ns1'):
+            ...
+
+        with profiler.phase('render', 'ns1', page='content/page.md'):
+            ...
+
+        body = re.sub(PATTERN, profiler.timed('tags', handler), body)
+    """
+
+    def __init__(self, enabled: bool = False) -> None:
+        self.enabled = enabled
+
+        self.phases = defaultdict(lambda: {'wall': 0.0, 'cpu': 0.0, 'count': 0}) # (namespace, phase) -> totals
+        self.directives = defaultdict(lambda: {'wall': 0.0, 'count': 0}) # directive type -> totals
+        self.pages = defaultdict(_page_totals) # page source -> totals
+
+        self._stack = []
+        self._page = None # totals of the page being timed, if any
+        self._start = (time.perf_counter(), time.process_time())
+
+    def phase(self, phase: str, namespace: str = '', page: str = ''):
+        """Return a context manager that times a phase. If a page is given then
+        the time is also added to the page's totals, along with any directives
+        processed during the phase.
+        """
+
+        if not self.enabled:
+            return nullcontext()
+
+        return _Timer(self, phase, namespace, str(page))
+
+    def timed(self, directive: str, handler):
+        """Wrap a directive handler (a function or string, as used by re.sub()) so that
+        each call is counted and timed. If not enabled the handler is returned as is.
+        """
+        if not self.enabled:
+            return handler
+
+        if isinstance(handler, str):
+            replacement = handler
+            handler = lambda match: replacement
+
+        totals = self.directives[directive]
+
+        def timed_handler(match):
+            start = time.perf_counter()
+
+            try:
+                return handler(match)
+            finally:
+                wall = time.perf_counter() - start
+
+                totals['wall'] += wall
+                totals['count'] += 1
+
+                if self._page is not None:
+                    page_totals = self._page['directives'][directive]
+                    page_totals['wall'] += wall
+                    page_totals['count'] += 1
+
+                    if wall > self._page['slowest'][0]:
+                        self._page['slowest'] = (wall, match.group(0) if match else directive)
+
+        return timed_handler
+
+    def snapshot(self) -> dict:
+        """Return the recorded totals in a form that can be sent to another
+        process (e.g. one building other namespaces), see merge().
+        """
+        return {
+            'phases': {k: dict(t) for k, t in self.phases.items()},
+            'directives': {d: dict(t) for d, t in self.directives.items()},
+            'pages': {p: {**t, 'directives': {d: dict(dt) for d, dt in t['directives'].items()}} for p, t in self.pages.items()}
+        }
+
+    def merge(self, snapshot: dict) -> None:
+        """Add the totals recorded by another profiler, see snapshot()."""
+
+        for key, totals in snapshot['phases'].items():
+            for field, value in totals.items():
+                self.phases[key][field] += value
+
+        for directive, totals in snapshot['directives'].items():
+            for field, value in totals.items():
+                self.directives[directive][field] += value
+
+        for page, totals in snapshot['pages'].items():
+            page_totals = self.pages[page]
+            page_totals['namespace'] = totals['namespace']
+            page_totals['wall'] += totals['wall']
+            page_totals['slowest'] = max(page_totals['slowest'], totals['slowest'])
+
+            for directive, directive_totals in totals['directives'].items():
+                for field, value in directive_totals.items():
+                    page_totals['directives'][directive][field] += value
+
+    def slowest_pages(self, count: int = 10) -> list[tuple[str, dict]]:
+        """Return the pages that took longest to render, slowest first, as a list
+        of (page, totals) tuples.
+        """
+        return sorted(self.pages.items(), key=lambda p: -p[1]['wall'])[:count]
+
+    def report(self) -> dict:
+        """Return the recorded times as a dictionary, suitable for saving as JSON.
+        Times are in seconds.
+        """
+        phases = defaultdict(dict)
+
+        for (namespace, phase), totals in self.phases.items():
+            phases[namespace or '_wiki'][phase] = dict(totals)
+
+        return {
+            'total': {'wall': time.perf_counter() - self._start[0], 'cpu': time.process_time() - self._start[1]},
+            'phases': dict(phases),
+            'directives': {d: dict(t) for d, t in self.directives.items() if t['count']},
+            'pages': {p: _page_report(t) for p, t in self.pages.items()}
+        }
+
+    def summary(self, slowest: int = 10) -> str:
+        """Return a human readable summary of the report, including the
+        slowest pages and the directives in them that took the longest.
+        """
+
+        report = self.report()
+
+        lines = [f"total: {report['total']['wall']:.3f}s wall, {report['total']['cpu']:.3f}s cpu", '',
+                 f"{'namespace':<20} {'phase':<12} {'wall (s)':>10} {'cpu (s)':>10} {'count':>8}"]
+
+        for namespace, phases in report['phases'].items():
+            for phase in sorted(phases, key=lambda p: PHASES.index(p) if p in PHASES else len(PHASES)):
+                totals = phases[phase]
+                lines.append(f"{namespace:<20} {phase:<12} {totals['wall']:>10.3f} {totals['cpu']:>10.3f} {totals['count']:>8}")
+
+        lines.extend(['', f"{'directive':<20} {'count':>8} {'wall (s)':>10}"])
+
+        for directive, totals in sorted(report['directives'].items(), key=lambda d: -d[1]['wall']):
+            lines.append(f"{directive:<20} {totals['count']:>8} {totals['wall']:>10.3f}")
+
+        if slowest > 0 and self.pages:
+            lines.extend(['', "slowest pages:"])
+
+            for page, totals in self.slowest_pages(slowest):
+                directives = ', '.join(f"{d} x{t['count']} {t['wall']:.3f}s"
+                                       for d, t in sorted(totals['directives'].items(), key=lambda d: -d[1]['wall']))
+
+                lines.append(f"{totals['wall']:>10.3f}s  {totals['namespace']}  {page}")
+
+                if directives:
+                    lines.append(f"{'':>13}{directives}")
+
+                if totals['slowest'][1]:
+                    lines.append(f"{'':>13}slowest directive: {totals['slowest'][1].strip()[:80]} ({totals['slowest'][0]:.3f}s)")
+
+        return '\n'.join(lines)
+
+    def save(self, path: Path | str) -> None:
+        with Path(path).open('w', encoding='utf8') as pf:
+            json.dump(self.report(), pf, indent=2)
+
+
+def _page_totals() -> dict:
+    return {'namespace': '', 'wall': 0.0, 'slowest': (0.0, ''),
+            'directives': defaultdict(lambda: {'wall': 0.0, 'count': 0})}
+
+
+def _page_report(totals: dict) -> dict:
+    return {
+        'namespace': totals['namespace'],
+        'wall': totals['wall'],
+        'directives': {d: dict(t) for d, t in totals['directives'].items()},
+        'slowest_directive': {'wall': totals['slowest'][0], 'directive': totals['slowest'][1]}
+    }
+
+
+DISABLED_PROFILER = Profiler()
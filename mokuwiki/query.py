@@ -0,0 +1,269 @@
+"""The tag query language used by tag directives. A query is compiled into a plan,
+which is a tree of tuples, that is then executed against a namespace's index.
+
+The original syntax is a chain of tags evaluated from left to right:
+
+-  `tag1 tag2`: pages with 'tag1' or 'tag2'
+-  `tag1 &tag2`: pages with 'tag1' and 'tag2'
+-  `tag1 !tag2`: pages with 'tag1' but not 'tag2'
+
+Within (and between) the items of the chain the following can also be used:
+
+-  `(...)`: grouping
+-  `A OR B`, `A AND B`, `NOT A`: keywords must be upper case. NOT binds more
+   tightly than AND, which binds more tightly than OR. All three bind more tightly
+   than the chain operators above, so `a b AND c` is `a OR (b AND c)`
+-  `field=value`, `field!=value`, `field<value`, `field<=value`, `field>value`,
+   `field>=value`: compare a metadata field, e.g. `level>3` or `monster.type=undead`.
+   Numeric values are compared as numbers, anything else as strings
+-  `ns:tag`: a namespace qualifier. A qualifier at the very start of the query
+   (e.g. `ns1:(a OR b)`) applies to the whole query; any others must refer to the
+   same namespace (see `get_namespaces()`)
+"""
+import re
+from functools import lru_cache
+
+KEYWORDS = ['AND', 'OR', 'NOT']
+
+NUMBER_RE = re.compile(r"^-?\d+(\.\d+)?$")
+
+QUALIFIER_RE = re.compile(r"^([\w-]+):(?=\S)")
+
+TOKEN_RE = re.compile(r"""\s*(?:
+    (?P<paren>[()])|
+    (?P<op>[&!])(?!=)|
+    (?P<cmp>[^\s()&!<>=]+?)\s*(?P<cmp_op><=|>=|!=|=|<|>)\s*(?P<cmp_value>[^\s()]+)|
+    (?P<word>[^\s()]+)
+)""", re.VERBOSE)
+
+
+class QueryError(ValueError):
+    """Raised for a tag query that cannot be compiled."""
+
+
+def split_namespace(query: str) -> tuple[str, str]:
+    """Split a leading namespace qualifier from a query, e.g. 'ns1:tag &abc'
+    returns ('ns1', 'tag &abc'). If there is no qualifier the first element is ''.
+    """
+    query = query.strip()
+
+    match = QUALIFIER_RE.match(query)
+
+    if not match:
+        return '', query
+
+    return match.group(1), query[match.end():]
+
+
+def to_number(value) -> float | None:
+    """Return a value as a number if it is (or looks like) one, else None.
+    Note: bool is a subclass of int but is not treated as a number.
+    """
+    if isinstance(value, bool):
+        return None
+
+    if isinstance(value, (int, float)):
+        return float(value)
+
+    if isinstance(value, str) and NUMBER_RE.match(value):
+        return float(value)
+
+    return None
+
+
+def tokenize(query: str) -> list[tuple[str, ...]]:
+    tokens = []
+    pos = 0
+
+    query = query.rstrip()
+
+    while pos < len(query):
+        match = TOKEN_RE.match(query, pos)
+
+        if not match or match.end() == pos:
+            raise QueryError(f"unexpected text in tag query at '{query[pos:]}'")
+
+        pos = match.end()
+
+        if match.group('paren'):
+            tokens.append(('paren', match.group('paren')))
+        elif match.group('op'):
+            tokens.append(('op', match.group('op')))
+        elif match.group('cmp'):
+            tokens.append(('cmp', match.group('cmp'), match.group('cmp_op'), match.group('cmp_value')))
+        elif match.group('word') in KEYWORDS:
+            tokens.append(('keyword', match.group('word')))
+        else:
+            tokens.append(('word', match.group('word')))
+
+    return tokens
+
+
+def chain_head(query: str) -> str | None:
+    """Return the first tag of a query in the original syntax, i.e. only a chain
+    of tags with '&' and '!', or None if the query uses any other syntax (or
+    cannot be compiled).
+    """
+    try:
+        tokens = tokenize(query)
+    except QueryError:
+        return None
+
+    if not tokens or tokens[0][0] != 'word' or any(t[0] not in ('word', 'op') for t in tokens):
+        return None
+
+    return tokens[0][1]
+
+
+class _Parser:
+    """A recursive descent parser, see the module docstring for the grammar."""
+
+    def __init__(self, query: str) -> None:
+        self.tokens = tokenize(query)
+        self.pos = 0
+
+    def peek(self) -> tuple | None:
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def pop(self) -> tuple:
+        token = self.peek()
+        self.pos += 1
+        return token
+
+    def parse(self) -> tuple:
+        plan = self.parse_chain()
+
+        if self.peek():
+            raise QueryError(f"unexpected '{self.peek()[1]}' in tag query")
+
+        return plan
+
+    def parse_chain(self) -> tuple:
+        plan = None
+
+        while self.peek() and self.peek() != ('paren', ')'):
+            op = self.pop()[1] if self.peek()[0] == 'op' else ''
+
+            operand = self.parse_or()
+
+            if plan is None:
+                # a leading '!' excludes pages from all pages, a leading '&' is ignored
+                plan = ('not', operand) if op == '!' else operand
+            elif op == '&':
+                plan = ('and', plan, operand)
+            elif op == '!':
+                plan = ('diff', plan, operand)
+            else:
+                plan = ('or', plan, operand)
+
+        if plan is None:
+            raise QueryError("empty tag query")
+
+        return plan
+
+    def parse_or(self) -> tuple:
+        plan = self.parse_and()
+
+        while self.peek() == ('keyword', 'OR'):
+            self.pop()
+            plan = ('or', plan, self.parse_and())
+
+        return plan
+
+    def parse_and(self) -> tuple:
+        plan = self.parse_not()
+
+        while self.peek() == ('keyword', 'AND'):
+            self.pop()
+            plan = ('and', plan, self.parse_not())
+
+        return plan
+
+    def parse_not(self) -> tuple:
+        if self.peek() == ('keyword', 'NOT'):
+            self.pop()
+            return ('not', self.parse_not())
+
+        return self.parse_primary()
+
+    def parse_primary(self) -> tuple:
+        token = self.pop()
+
+        if not token:
+            raise QueryError("unexpected end of tag query")
+
+        if token == ('paren', '('):
+            plan = self.parse_chain()
+
+            if self.pop() != ('paren', ')'):
+                raise QueryError("missing ')' in tag query")
+
+            return plan
+
+        if token[0] == 'cmp':
+            _, field, op, value = token
+            return ('meta', field, op, value)
+
+        if token[0] == 'word':
+            namespace, _, tag = token[1].rpartition(':')
+            return ('tag', tag, namespace)
+
+        raise QueryError(f"unexpected '{token[1]}' in tag query")
+
+
+@lru_cache(maxsize=1024)
+def compile_query(query: str) -> tuple:
+    """Compile a query into a plan, a tree of tuples such as:
+
+        ('or', ('tag', 'abc', ''), ('and', ('tag', 'def', 'ns1'), ('meta', 'level', '>', '3')))
+
+    where the last element of a 'tag' step is its namespace qualifier, if any.
+
+    Args:
+        query (str): The query, without any leading namespace qualifier
+
+    Raises:
+        QueryError: if the query is not valid
+    """
+    return _Parser(query).parse()
+
+
+def get_namespaces(plan: tuple) -> set[str]:
+    """Return the namespace qualifiers used in a plan."""
+
+    if plan[0] == 'tag':
+        return {plan[2]} if plan[2] else set()
+
+    if plan[0] == 'meta':
+        return set()
+
+    return set().union(*[get_namespaces(p) for p in plan[1:]])
+
+
+def execute_plan(plan: tuple, index) -> int:
+    """Execute a plan against an index, returning a bitmap of page ids."""
+
+    kind = plan[0]
+
+    if kind == 'tag':
+        return index.get_tagged_bits(plan[1])
+
+    if kind == 'meta':
+        return index.get_meta_bits(plan[1], plan[2], plan[3])
+
+    if kind == 'not':
+        return index.get_all_bits() & ~execute_plan(plan[1], index)
+
+    left = execute_plan(plan[1], index)
+    right = execute_plan(plan[2], index)
+
+    if kind == 'and':
+        return left & right
+
+    if kind == 'or':
+        return left | right
+
+    if kind == 'diff':
+        return left & ~right
+
+    raise QueryError(f"unknown query plan step '{kind}'")
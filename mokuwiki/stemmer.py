@@ -0,0 +1,178 @@
+"""A plain Python implementation of the Porter stemming algorithm, see
+https://tartarus.org/martin/PorterStemmer/def.txt for the definition.
+"""
+
+VOWELS = 'aeiou'
+
+STEP2_SUFFIXES = [('ational', 'ate'), ('tional', 'tion'), ('enci', 'ence'), ('anci', 'ance'),
+                  ('izer', 'ize'), ('abli', 'able'), ('alli', 'al'), ('entli', 'ent'),
+                  ('eli', 'e'), ('ousli', 'ous'), ('ization', 'ize'), ('ation', 'ate'),
+                  ('ator', 'ate'), ('alism', 'al'), ('iveness', 'ive'), ('fulness', 'ful'),
+                  ('ousness', 'ous'), ('aliti', 'al'), ('iviti', 'ive'), ('biliti', 'ble')]
+
+STEP3_SUFFIXES = [('icate', 'ic'), ('ative', ''), ('alize', 'al'), ('iciti', 'ic'),
+                  ('ical', 'ic'), ('ful', ''), ('ness', '')]
+
+STEP4_SUFFIXES = ['al', 'ance', 'ence', 'er', 'ic', 'able', 'ible', 'ant', 'ement',
+                  'ment', 'ent', 'ion', 'ou', 'ism', 'ate', 'iti', 'ous', 'ive', 'ize']
+
+
+class PorterStemmer:
+    """Reduce English words to their stems, e.g. 'connected', 'connecting'
+    and 'connection' all become 'connect'. Words are expected to be lower case.
+    """
+
+    def __init__(self) -> None:
+        # stemming is deterministic, so remember previous results
+        self._cache = {}
+
+    def stem(self, word: str) -> str:
+
+        if word in self._cache:
+            return self._cache[word]
+
+        stem = word
+
+        if len(word) > 2 and word.isalpha():
+            stem = self._step1a(stem)
+            stem = self._step1b(stem)
+            stem = self._step1c(stem)
+            stem = self._step2(stem)
+            stem = self._step3(stem)
+            stem = self._step4(stem)
+            stem = self._step5(stem)
+
+        self._cache[word] = stem
+
+        return stem
+
+    @staticmethod
+    def _is_consonant(word: str, i: int) -> bool:
+        if word[i] in VOWELS:
+            return False
+
+        if word[i] == 'y':
+            return i == 0 or not PorterStemmer._is_consonant(word, i - 1)
+
+        return True
+
+    @staticmethod
+    def _measure(stem: str) -> int:
+        """Return the number of vowel-consonant sequences in the stem, i.e.
+        'm' in the form [C](VC)^m[V].
+        """
+        measure = 0
+        previous_vowel = False
+
+        for i in range(len(stem)):
+            consonant = PorterStemmer._is_consonant(stem, i)
+
+            if consonant and previous_vowel:
+                measure += 1
+
+            previous_vowel = not consonant
+
+        return measure
+
+    @staticmethod
+    def _has_vowel(stem: str) -> bool:
+        return any(not PorterStemmer._is_consonant(stem, i) for i in range(len(stem)))
+
+    @staticmethod
+    def _ends_double_consonant(word: str) -> bool:
+        return len(word) >= 2 and word[-1] == word[-2] and PorterStemmer._is_consonant(word, len(word) - 1)
+
+    @staticmethod
+    def _ends_cvc(word: str) -> bool:
+        if len(word) < 3:
+            return False
+
+        return (PorterStemmer._is_consonant(word, len(word) - 3) and
+                not PorterStemmer._is_consonant(word, len(word) - 2) and
+                PorterStemmer._is_consonant(word, len(word) - 1) and
+                word[-1] not in 'wxy')
+
+    def _replace(self, word: str, rules: list[tuple[str, str]], min_measure: int) -> str:
+        """Apply the first rule whose suffix matches the word, if the remaining
+        stem has a measure greater than `min_measure`. Only one rule is ever tried.
+        """
+        for suffix, replacement in rules:
+            if word.endswith(suffix):
+                stem = word[:-len(suffix)]
+                return stem + replacement if self._measure(stem) > min_measure else word
+
+        return word
+
+    def _step1a(self, word: str) -> str:
+        if word.endswith('sses'):
+            return word[:-2]
+
+        if word.endswith('ies'):
+            return word[:-2]
+
+        if word.endswith('ss'):
+            return word
+
+        if word.endswith('s'):
+            return word[:-1]
+
+        return word
+
+    def _step1b(self, word: str) -> str:
+        if word.endswith('eed'):
+            return word[:-1] if self._measure(word[:-3]) > 0 else word
+
+        for suffix in ['ed', 'ing']:
+            if word.endswith(suffix) and self._has_vowel(word[:-len(suffix)]):
+                word = word[:-len(suffix)]
+                break
+        else:
+            return word
+
+        if word.endswith(('at', 'bl', 'iz')):
+            return word + 'e'
+
+        if self._ends_double_consonant(word) and word[-1] not in 'lsz':
+            return word[:-1]
+
+        if self._measure(word) == 1 and self._ends_cvc(word):
+            return word + 'e'
+
+        return word
+
+    def _step1c(self, word: str) -> str:
+        if word.endswith('y') and self._has_vowel(word[:-1]):
+            return word[:-1] + 'i'
+
+        return word
+
+    def _step2(self, word: str) -> str:
+        return self._replace(word, STEP2_SUFFIXES, 0)
+
+    def _step3(self, word: str) -> str:
+        return self._replace(word, STEP3_SUFFIXES, 0)
+
+    def _step4(self, word: str) -> str:
+        for suffix in STEP4_SUFFIXES:
+            if word.endswith(suffix):
+                stem = word[:-len(suffix)]
+
+                if suffix == 'ion' and not stem.endswith(('s', 't')):
+                    return word
+
+                return stem if self._measure(stem) > 1 else word
+
+        return word
+
+    def _step5(self, word: str) -> str:
+        if word.endswith('e'):
+            stem = word[:-1]
+            measure = self._measure(stem)
+
+            if measure > 1 or (measure == 1 and not self._ends_cvc(stem)):
+                word = stem
+
+        if word.endswith('ll') and self._measure(word) > 1:
+            word = word[:-1]
+
+        return word
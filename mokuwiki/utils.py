@@ -4,9 +4,33 @@ import re
 import argparse
 import logging
 
+import yaml
+
+try:
+    from yaml import CSafeLoader
+except ImportError:
+    # PyYAML was built without libyaml
+    CSafeLoader = None
+
 DEFAULT_IMAGE_TYPE = 'jpg'
 MARKDOWN_PARA_SEP = "\n\n"
 
+# split a directive into arguments, keeping double quoted strings together
+OPTIONS_SPLIT_RE = r"(?:\".*?\"|\S)+"
+
+YAML_LOADERS = ['fast', 'c', 'python']
+
+# a line of 'simple' YAML, i.e. 'key: value', where the value is not empty
+SIMPLE_YAML_RE = re.compile(r"^([A-Za-z_][\w.-]*):[ ]+(\S.*?)[ ]*$")
+
+# characters that may change the meaning of a plain YAML scalar
+YAML_INDICATORS = frozenset('-?:,[]{}#&*!|>\'"%@`')
+YAML_FLOW_CHARS = frozenset(',[]{}')
+
+YAML_STR_TAG = 'tag:yaml.org,2002:str'
+
+_yaml_resolver = yaml.resolver.Resolver()
+
 
 class OptionsParser:
     # TODO when these error they report they are mokuwiki, not something else!
@@ -26,7 +50,7 @@ class OptionsParser:
     
     def parse(self, line) -> dict:
         try:
-            options = self._parser.parse_args(re.findall(r"(?:\".*?\"|\S)+", line))
+            options = self._parser.parse_args(split_options(line))
         except (argparse.ArgumentError, argparse.ArgumentTypeError):
             logging.error(f"Error parsing directive for {line}")
             # TODO check returned value when used as options.format will not exist etc
@@ -85,6 +109,8 @@ class TagListParser(OptionsParser):
         self._parser.add_argument('--before', default='\n')
         self._parser.add_argument('--after', default='\n')
         self._parser.add_argument('--table', default='')
+        self._parser.add_argument('--sort-by', default='')
+        self._parser.add_argument('--reverse', action='store_true', default=False)
         
         """TODO --table option eg. --table "<Name:title,Rank:level"
         so would have column_title:metadata_element, then maybe some 
@@ -149,6 +175,103 @@ class TagListParser(OptionsParser):
         return options
 
 
+def split_options(line: str) -> list[str]:
+    """Split a directive into a list of arguments, as for a command line.
+    Double quoted strings are not split.
+    """
+    return re.findall(OPTIONS_SPLIT_RE, line)
+
+def get_meta_value(meta: dict, field: str):
+    """Get a metadata value, where the field can refer to nested values using
+    dots, e.g. 'monster.rank' is the value of 'rank' in the 'monster' dictionary.
+    Returns None if the field does not exist.
+    """
+    if field in meta:
+        return meta[field]
+
+    value = meta
+
+    for key in field.split('.'):
+        if not isinstance(value, dict) or key not in value:
+            return None
+
+        value = value[key]
+
+    return value
+
+def _is_plain_str(value: str) -> bool:
+    """True if a plain YAML scalar would be loaded as the same string."""
+
+    if not value or not value.isprintable() or value[0] in YAML_INDICATORS:
+        return False
+
+    if ': ' in value or ' #' in value or value.endswith(':') or '\t' in value:
+        return False
+
+    if any(c in YAML_FLOW_CHARS for c in value):
+        return False
+
+    return _yaml_resolver.resolve(yaml.ScalarNode, value, (True, False)) == YAML_STR_TAG
+
+
+def load_simple_yaml(text: str) -> dict | None:
+    """Load YAML that only contains 'key: value' lines, where each value is a
+    string or a list of strings (e.g. '[abc, def]'), without using the YAML
+    parser. Returns None if the YAML is not that simple, or if loading it with
+    the parser might give a different result.
+    """
+    data = {}
+
+    for line in text.splitlines():
+        if not line.strip() or (not data and line.rstrip() == '---'):
+            continue
+
+        match = SIMPLE_YAML_RE.match(line)
+
+        if not match or not _is_plain_str(match.group(1)):
+            return None
+
+        key, value = match.groups()
+
+        if value.startswith('[') and value.endswith(']'):
+            items = [item.strip() for item in value[1:-1].split(',')] if value[1:-1].strip() else []
+
+            # the parser treats some indicators differently inside a list (e.g. 'a?' is an error)
+            if not all(_is_plain_str(item) and YAML_INDICATORS.isdisjoint(item) for item in items):
+                return None
+
+            data[key] = items
+        elif _is_plain_str(value):
+            data[key] = value
+        else:
+            return None
+
+    return data or None
+
+
+def load_yaml(text: str, loader: str = 'fast'):
+    """Load YAML (e.g. page metadata) using one of the following loaders:
+
+    -  'fast': simple metadata (see load_simple_yaml()) is loaded without the
+       YAML parser, anything else with the 'c' loader (the default)
+    -  'c': PyYAML's libyaml based loader, if available, otherwise 'python'
+    -  'python': PyYAML's pure Python loader, i.e. yaml.safe_load()
+
+    Raises:
+        yaml.YAMLError: if the YAML is not valid
+    """
+    if loader == 'fast':
+        data = load_simple_yaml(text)
+
+        if data is not None:
+            return data
+
+    if loader != 'python' and CSafeLoader:
+        return yaml.load(text, Loader=CSafeLoader)
+
+    return yaml.safe_load(text)
+
+
 def make_file_name(name: str, ext: str = '') -> str:
     """Return a valid filename from a string, optionally including a file
     extension. For what 'valid' means in this context, see
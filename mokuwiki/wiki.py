@@ -1,16 +1,27 @@
 import argparse
+import json
 import shutil
 import sys
+import multiprocessing
+from collections import defaultdict
+from pathlib import Path
 
 from mokuwiki.config import WikiConfig
+from mokuwiki.execute import CallableRegistry, ExecCache
+from mokuwiki.manifest import MANIFEST_FILE, Manifest, RenderCache, config_fingerprints, hash_data
 from mokuwiki.namespace import Namespace
 from mokuwiki.page import Page
 from mokuwiki.process import Processor
+from mokuwiki.profiler import Profiler
 
 import logging
 logging.basicConfig(format='mokuwiki: %(levelname)s %(message)s', level=logging.WARNING)
 
 
+# the wiki being built, which worker processes inherit when they are forked, see Wiki.process_wiki()
+_wiki = None
+
+
 class Wiki:
     """The Wiki class definition.
 
@@ -20,7 +31,7 @@ class Wiki:
         turn, control the reading and creation of individual pages.
     """
     
-    def __init__(self, config: dict | str, verbose: int = 1) -> str:
+    def __init__(self, config: dict | str, verbose: int = 1, profile: bool = False) -> str:
         """Initialize a Wiki instance.
 
         Args:
@@ -28,6 +39,7 @@ class Wiki:
             reindex (bool, optional): Force re-indexing of all create_indexes. Defaults to False.
             nosearch (bool, optional): Stop creation of a search index. Defaults to False.
             verbose (int, optional): Increase verbose level. Defaults to 1.
+            profile (bool, optional): Record the time taken by each phase of the build. Defaults to False.
         """
         try:
             self.config = WikiConfig(config)
@@ -35,12 +47,32 @@ class Wiki:
             raise ValueError("Could not initialize wiki")
                 
         self._set_reporting_level(verbose)
+
+        self.profiler = Profiler(profile)
         
         # set up build dir
         if self.config.clean in ['setup', 'always']:
             shutil.rmtree(self.config.build_dir, ignore_errors=True)
             
         self.config.build_dir.mkdir(parents=True, exist_ok=True)
+
+        # rendered pages kept between builds
+        self.render_cache = RenderCache(self.config.render_cache_dir)
+
+        # the source files and rendered pages of the last build, for incremental builds and the render cache
+        self.manifest = Manifest(self.config.build_dir / MANIFEST_FILE, self.config.incremental or self.render_cache.enabled,
+                                 self.config.incremental)
+
+        # outputs of exec directives, shared by all namespaces
+        self.exec_cache = ExecCache(self.config.exec_cache, self.config.exec_cache_ttl,
+                                    self.config.exec_cache_dir, self.config.exec_timeout)
+
+        # without a cache each directive runs its own command as the page is processed
+        if self.config.exec_workers > 1 and self.exec_cache.scope == 'none':
+            logging.warning("exec_workers has no effect when exec_cache is 'none', commands are run one at a time")
+
+        # Python functions for 'py:' exec directives
+        self.callables = CallableRegistry(self.config.exec_callables)
         
         # create namespaces
         self.namespaces = {}
@@ -165,20 +197,174 @@ class Wiki:
         
         logging.info("processing wiki")
 
-        for namespace in self.namespaces:
-            self.namespaces[namespace].preprocess_pages()
-            self.namespaces[namespace].load_pages()
+        workers = self.namespace_workers()
 
-        for namespace in self.namespaces:
-            self.namespaces[namespace].process_pages()
+        if workers > 1:
+            self.load_namespaces(workers)
+        else:
+            for namespace in self.namespaces:
+                with self.profiler.phase('preprocess', namespace):
+                    self.namespaces[namespace].preprocess_pages()
+
+                self.namespaces[namespace].load_pages()
+
+        if self.manifest.enabled:
+            self.manifest.index = self.index_digest()
+            self.manifest.fingerprints = config_fingerprints(self.config.config)
+
+        if self.config.exec_workers > 1:
+            with self.profiler.phase('exec'):
+                self.prefetch_exec_commands()
+
+        if workers > 1:
+            self.process_namespaces(workers)
+        else:
+            for namespace in self.namespaces:
+                self.namespaces[namespace].process_pages()
+
+        if self.config.search_merged_file:
+            with self.profiler.phase('search'):
+                self.export_search_index()
             
         for namespace in self.namespaces:
-            self.namespaces[namespace].postprocess_pages()
+            with self.profiler.phase('postprocess', namespace):
+                self.namespaces[namespace].postprocess_pages()
+
+        self.manifest.save()
 
         # tear down build dir
         if self.config.clean in ['teardown', 'always']:
             shutil.rmtree(self.config.build_dir, ignore_errors=False)
 
+    def namespace_workers(self) -> int:
+        """Return the number of processes to load and render namespaces with,
+        or 0 if they are processed one at a time. Worker processes are forked,
+        so that they start with a copy of the wiki (including every namespace's
+        index once the pages have been loaded), which is not possible on all
+        platforms.
+        """
+        workers = min(self.config.namespace_workers, len(self.namespaces))
+
+        if workers < 2:
+            return 0
+
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            logging.warning("namespace_workers needs processes to be forked, which is not supported, processing namespaces one at a time")
+            return 0
+
+        return workers
+
+    def load_namespaces(self, workers: int) -> None:
+        """Preprocess and read the pages of the namespaces in worker processes,
+        then index the pages in this one. Pages are indexed in the same order
+        as when the namespaces are loaded one at a time.
+        """
+        for name, result in zip(self.namespaces, self._map_namespaces(_read_namespace, workers)):
+            namespace = self.namespaces[name]
+
+            namespace.page_keys.update(result['page_keys'])
+            self.manifest.files.update(result['files'])
+            self.profiler.merge(result['profile'])
+
+            for page in result['pages']:
+                page.namespace = namespace
+                namespace.index_page(page)
+
+            logging.debug(f"loaded namespace '{name}'")
+
+    def process_namespaces(self, workers: int) -> None:
+        """Render the pages of the namespaces in worker processes. Each worker
+        has a copy of the indexes of every namespace, for links between
+        namespaces, and returns the broken links it found (in any namespace)
+        and its additions to the build manifest.
+        """
+        for result in self._map_namespaces(_process_namespace, workers):
+            for name, broken in result['broken'].items():
+                for broken_name in broken:
+                    self.namespaces[name].index.add_broken(broken_name)
+
+            self.manifest.files.update(result['files'])
+            self.manifest.pages.update(result['pages'])
+            self.profiler.merge(result['profile'])
+
+    def _map_namespaces(self, function, workers: int) -> list[dict]:
+        global _wiki
+
+        _wiki = self
+
+        try:
+            with multiprocessing.get_context('fork').Pool(workers) as pool:
+                return pool.map(function, list(self.namespaces), chunksize=1)
+        finally:
+            _wiki = None
+
+    def index_digest(self) -> str:
+        """Return a hash of the metadata of every page in the wiki. Page links,
+        tag directives and ToCs only depend on the metadata of other pages, so
+        if this has not changed then neither has their output.
+        """
+        return hash_data([[name, [hash_data(p.meta) for p in namespace.pages]] for name, namespace in self.namespaces.items()])
+
+    def prefetch_exec_commands(self) -> None:
+        """Find the exec directives in all pages and run them concurrently, so
+        their (cached) output is ready when the pages are processed. Commands
+        that only appear in included files are run when the page is processed.
+        """
+        commands = {}
+
+        for namespace in self.namespaces.values():
+            for page in namespace.pages:
+                for command in page.get_exec_commands():
+                    commands.setdefault(command, page.source)
+
+        self.exec_cache.prefetch(commands, self.config.exec_workers)
+
+    def export_search_index(self) -> None:
+        """Merge the search indexes of all namespaces into a single JSON file, so that
+        a site-wide search only has to load one file. Pages are listed once, as a path
+        relative to the site root (pages in the root namespace are at the top level)
+        and a title, and each term refers to pages by their position in that list:
+
+            {
+                "pages": [["page_one", "Page One"], ["ns2/page_two", "Page Two"]],
+                "terms": {"page": [0, 1], "one": [0], "two": [1]}
+            }
+
+        The file is saved in the root namespace's target dir, as the top of the
+        site, so that the root namespace's postprocessing can copy it there.
+        """
+
+        pages = []
+        page_ids = {}
+        terms = defaultdict(list)
+
+        for namespace in self.namespaces.values():
+
+            for term, refs in namespace.index.get_search_index().items():
+
+                for file_name, title in refs:
+                    path = file_name if namespace.is_root else f"{namespace.name}/{file_name}"
+
+                    if path not in page_ids:
+                        page_ids[path] = len(pages)
+                        pages.append((path, title))
+
+                    terms[term].append(page_ids[path])
+
+        search_index = self.config.search_prefix + json.dumps({'pages': pages, 'terms': terms}, separators=(',', ':'))
+
+        root = next((ns for ns in self.namespaces.values() if ns.is_root), None)
+
+        if root is None:
+            logging.warning(f"no root namespace, saving merged search index in '{self.config.build_dir}'")
+
+        target_dir = Path(root.config.target_dir) if root else self.config.build_dir
+
+        with (target_dir / self.config.search_merged_file).open('w', encoding='utf8') as jf:
+            jf.write(search_index)
+
+        logging.debug(f"exported merged search index for {len(pages)} pages")
+
     def report_broken_links(self) -> None:
         """Report broken links in namespaces.
         """
@@ -187,6 +373,51 @@ class Wiki:
             self.namespaces[namespace].report_broken_links()
 
 
+def _worker_wiki() -> Wiki:
+    """Return the wiki in a worker process, with a new profiler and an empty
+    list of rendered pages, so only what happens in this task is returned.
+    """
+    _wiki.profiler = Profiler(_wiki.profiler.enabled)
+    _wiki.manifest.pages = {}
+
+    return _wiki
+
+
+def _new_files(wiki: Wiki, hashed: set[str]) -> dict:
+    return {k: f for k, f in wiki.manifest.files.items() if k not in hashed}
+
+
+def _read_namespace(name: str) -> dict:
+    wiki = _worker_wiki()
+    namespace = wiki.namespaces[name]
+
+    # workers are re-used, so the files of namespaces read earlier by this one have been hashed already
+    hashed = set(wiki.manifest.files)
+
+    with wiki.profiler.phase('preprocess', name):
+        namespace.preprocess_pages()
+
+    pages = list(namespace.read_pages())
+
+    # each namespace is only read once, so its page keys are all from this task
+    return {'pages': pages, 'page_keys': namespace.page_keys, 'files': _new_files(wiki, hashed),
+            'profile': wiki.profiler.snapshot()}
+
+
+def _process_namespace(name: str) -> dict:
+    wiki = _worker_wiki()
+
+    # files hashed and broken links found before this task, e.g. the pages, are already in the parent
+    hashed = set(wiki.manifest.files)
+    broken = {n: set(ns.index.get_broken()) for n, ns in wiki.namespaces.items()}
+
+    wiki.namespaces[name].process_pages()
+
+    return {'broken': {n: ns.index.get_broken() - broken[n] for n, ns in wiki.namespaces.items()},
+            'files': _new_files(wiki, hashed),
+            'pages': wiki.manifest.pages, 'profile': wiki.profiler.snapshot()}
+
+
 def mokuwiki(args=None):
     if args is None:
         args = sys.argv[1:]
@@ -194,10 +425,12 @@ def mokuwiki(args=None):
     parser = argparse.ArgumentParser(description='Convert folder of Markdown files to support interpage linking and tags')
     parser.add_argument('config', help='Wiki configuration file')
     parser.add_argument('-v', '--verbose', help='Set logging verbosity', action='count')
+    parser.add_argument('-p', '--profile', help='Save timings of the build to a JSON file and print a summary', metavar='FILE')
+    parser.add_argument('--slowest', help='Number of slowest pages to list in the profile summary', type=int, default=10, metavar='N')
 
     args = parser.parse_args(args)
 
-    wiki = Wiki(args.config, verbose=args.verbose)
+    wiki = Wiki(args.config, verbose=args.verbose, profile=bool(args.profile))
 
     if len(wiki) == 0:
         logging.error(f"wiki '{wiki.name}' has no valid namespaces")
@@ -205,3 +438,7 @@ def mokuwiki(args=None):
 
     wiki.process_wiki()
     wiki.report_broken_links()
+
+    if args.profile:
+        wiki.profiler.save(args.profile)
+        print(wiki.profiler.summary(args.slowest))
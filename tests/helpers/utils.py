@@ -1,8 +1,11 @@
+import os
 import yaml
 from textwrap import dedent
 from pathlib import Path
 import logging
 
+from mokuwiki.wiki import Wiki
+
 class Markdown:
     
     def __init__(self) -> None:
@@ -82,3 +85,32 @@ class Markdown:
             content.reverse()
 
         return '\n'.join(content)
+
+
+def build_wiki(wiki_config: str, profile: bool = False, **options) -> Wiki:
+    """Build a wiki from a configuration in YAML, with any options overridden."""
+
+    config = yaml.safe_load(wiki_config)
+    config.update(options)
+
+    wiki = Wiki(config, profile=profile)
+    wiki.process_wiki()
+
+    return wiki
+
+
+def build_written(wiki_config: str, directory: Path, **options) -> set:
+    """Build a wiki (see build_wiki()) and return the titles of the pages in a
+    directory (or its sub-directories, e.g. the build dir or a render cache)
+    that the build wrote. Pages already there are given an old modification
+    time first, so that those written again can be told apart.
+    """
+
+    for path in Path(directory).rglob('*.md'):
+        os.utime(path, ns=(0, 0))
+
+    build_wiki(wiki_config, **options)
+
+    written = [p for p in Path(directory).rglob('*.md') if p.stat().st_mtime_ns != 0]
+
+    return {yaml.safe_load(Markdown.read(p).partition('...\n')[0])['title'] for p in written}
@@ -0,0 +1,113 @@
+import json
+import yaml
+
+import deepdiff
+
+from mokuwiki.wiki import Wiki
+from mokuwiki.analyzer import Analyzer
+from mokuwiki.stemmer import PorterStemmer
+
+from utils import Markdown
+
+PROCESS = 'mokuwiki'
+
+
+def test_porter_stemmer():
+
+    stemmer = PorterStemmer()
+
+    source = ['caresses', 'ponies', 'agreed', 'motoring', 'hopping', 'relational',
+              'conditional', 'generalizations', 'adjustment', 'controll']
+    expect = ['caress', 'poni', 'agre', 'motor', 'hop', 'relat',
+              'condit', 'gener', 'adjust', 'control']
+
+    actual = [stemmer.stem(w) for w in source]
+
+    assert expect == actual
+
+
+def test_analyzer_default():
+    """The default analyzer should match the original behaviour"""
+
+    analyzer = Analyzer(stopwords=['a', 'the'])
+
+    actual = analyzer.analyze("The Café's well-known menu, a 2nd visit")
+    expect = ['cafs', 'wellknown', 'menu', '2nd', 'visit']
+
+    assert expect == actual
+
+
+def test_analyzer_pipeline():
+
+    analyzer = Analyzer('words', folding=True, stemmer='porter', stopwords=['a', 'the'])
+
+    actual = analyzer.analyze("The Café's well-known menus, a 2nd visiting")
+    expect = ['cafe', 's', 'well', 'known', 'menu', '2nd', 'visit']
+
+    assert expect == actual
+
+
+def test_search_index_stemmer(tmp_path):
+
+    source = tmp_path / 'source'
+    source.mkdir()
+
+    ns1 = source / 'ns1'
+    ns1.mkdir()
+
+    file1 = ns1 / 'file1.md'
+    Markdown.write(file1,
+                   """
+                   ---
+                   title: Running Monsters
+                   tags: [monsters]
+                   ...
+                   Text
+                   """)
+
+    file2 = ns1 / 'file2.md'
+    Markdown.write(file2,
+                   """
+                   ---
+                   title: Monster Runs
+                   tags: [Élite]
+                   ...
+                   Text
+                   """)
+
+    wiki_config = f"""
+        name: test
+        build_dir: {tmp_path}
+        namespaces:
+          ns1:
+              content: {ns1}
+              search_fields: ['title', 'tags']
+              search_tokenizer: words
+              search_folding: true
+              search_stemmer: porter
+        """
+
+    wiki = Wiki(yaml.safe_load(wiki_config))
+    wiki.process_wiki()
+
+    index1 = tmp_path / 'ns1' / PROCESS / '_index.json'
+    assert index1.exists()
+
+    expect = {
+        "run": [
+            ["running_monsters", "Running Monsters"],
+            ["monster_runs", "Monster Runs"]
+        ],
+        "monster": [
+            ["running_monsters", "Running Monsters"],
+            ["monster_runs", "Monster Runs"]
+        ],
+        "elit": [
+            ["monster_runs", "Monster Runs"]
+        ]
+    }
+
+    with index1.open('r', encoding='utf8') as fh:
+        actual = json.loads(fh.read())
+
+    assert not deepdiff.DeepDiff(expect, actual, ignore_order=True)
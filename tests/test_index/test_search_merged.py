@@ -0,0 +1,124 @@
+import json
+import yaml
+
+import deepdiff
+
+from mokuwiki.wiki import Wiki
+
+from utils import Markdown
+
+
+def test_search_index_merged(tmp_path):
+
+    source = tmp_path / 'source'
+    source.mkdir()
+
+    ns1 = source / 'ns1'
+    ns1.mkdir()
+
+    ns2 = source / 'ns2'
+    ns2.mkdir()
+
+    file1 = ns1 / 'file1.md'
+    Markdown.write(file1,
+                   """
+                   ---
+                   title: Page One
+                   tags: [abc]
+                   ...
+                   A link to [[Page Two]]
+                   """)
+
+    file2 = ns2 / 'file2.md'
+    Markdown.write(file2,
+                   """
+                   ---
+                   title: Page Two
+                   tags: [abc]
+                   ...
+                   A link to [[Page One]]
+                   """)
+
+    wiki_config = f"""
+        name: test
+        build_dir: {tmp_path}
+        search_merged_file: _search.json
+        search_prefix: 'var idx = '
+        namespaces:
+          ns1:
+              content: {ns1}
+              search_fields: ['title', 'tags']
+              is_root: true
+          ns2:
+              content: {ns2}
+              search_fields: ['title', 'tags']
+        """
+
+    wiki = Wiki(yaml.safe_load(wiki_config))
+    wiki.process_wiki()
+
+    # in the root namespace's target dir
+    merged = tmp_path / 'ns1' / 'mokuwiki' / '_search.json'
+    assert merged.exists()
+
+    with merged.open('r', encoding='utf8') as fh:
+        index = fh.read()
+
+    assert index.startswith('var idx = ')
+
+    actual = json.loads(index[len('var idx = '):])
+
+    assert sorted(actual['pages']) == [['ns2/page_two', 'Page Two'], ['page_one', 'Page One']]
+
+    # resolve page references to compare terms
+    actual = {t: [actual['pages'][p][0] for p in refs] for t, refs in actual['terms'].items()}
+
+    expect = {
+        "page": ["page_one", "ns2/page_two"],
+        "abc": ["page_one", "ns2/page_two"],
+        "one": ["page_one"],
+        "two": ["ns2/page_two"]
+    }
+
+    assert not deepdiff.DeepDiff(expect, actual, ignore_order=True)
+
+
+def test_search_index_merged_teardown(tmp_path):
+    """The merged index can be copied to the site by postprocessing before the build dir is removed"""
+
+    ns1 = tmp_path / 'source' / 'ns1'
+    ns1.mkdir(parents=True)
+
+    Markdown.write(ns1 / 'file1.md',
+                   """
+                   ---
+                   title: Page One
+                   ...
+                   Some text
+                   """)
+
+    site = tmp_path / 'site'
+    site.mkdir()
+
+    wiki_config = f"""
+        name: test
+        build_dir: {tmp_path / 'build'}
+        search_merged_file: _search.json
+        clean: teardown
+        namespaces:
+          ns1:
+              content: {ns1}
+              search_fields: ['title']
+              is_root: true
+              postprocessing:
+                  - cp {tmp_path / 'build' / 'ns1' / 'mokuwiki' / '_search.json'} {site}
+        """
+
+    wiki = Wiki(yaml.safe_load(wiki_config))
+    wiki.process_wiki()
+
+    assert not (tmp_path / 'build').exists()
+
+    index = json.loads((site / '_search.json').read_text(encoding='utf8'))
+
+    assert index['pages'] == [['page_one', 'Page One']]
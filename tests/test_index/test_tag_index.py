@@ -0,0 +1,95 @@
+import yaml
+import pytest
+
+from mokuwiki.wiki import Wiki
+from mokuwiki.query import QueryError, compile_query
+
+from utils import Markdown
+
+
+def make_wiki(tmp_path):
+
+    source = tmp_path / 'source'
+    source.mkdir()
+
+    ns1 = source / 'ns1'
+    ns1.mkdir()
+
+    for i, tags in enumerate(['[abc]', '[abc, def]', '[def, xyz]', '[abc, def, xyz]']):
+        Markdown.write(ns1 / f'file{i}.md',
+                       f"""
+                       ---
+                       title: Page {i}
+                       tags: {tags}
+                       level: {i * 2}
+                       monster:
+                           type: {'undead' if i % 2 else 'beast'}
+                       ...
+                       Text {i}
+                       """)
+
+    wiki_config = f"""
+        name: test
+        build_dir: {tmp_path}
+        namespaces:
+          ns1:
+              content: {ns1}
+        """
+
+    wiki = Wiki(yaml.safe_load(wiki_config))
+    wiki.namespaces['ns1'].load_pages()
+
+    return wiki.namespaces['ns1'].index
+
+
+def test_tag_index_bits(tmp_path):
+
+    index = make_wiki(tmp_path)
+
+    bits = index.get_tagged_bits('abc')
+
+    assert bits.bit_count() == 3
+    assert set(index.get_titles_by_bits(bits)) == {'Page 0', 'Page 1', 'Page 3'}
+    assert index.get_titles_by_bits(0) == []
+    assert index.get_tagged_pages('xyz') == {'Page 2', 'Page 3'}
+    assert index.get_tagged_bits('nosuchtag') == 0
+    assert index.get_tagged_bits('def').bit_count() == 3
+
+
+def test_tag_index_query(tmp_path):
+
+    index = make_wiki(tmp_path)
+
+    assert set(index.query('abc &def')) == {'Page 1', 'Page 3'}
+    assert set(index.query('abc !xyz')) == {'Page 0', 'Page 1'}
+    assert set(index.query('abc xyz')) == {'Page 0', 'Page 1', 'Page 2', 'Page 3'}
+    assert set(index.query('abc &def !xyz')) == {'Page 1'}
+    assert set(index.query('abc &nosuchtag')) == set()
+
+    # repeated queries are answered from the cache
+    assert compile_query('abc &def') in index._tag_queries
+
+
+def test_tag_index_query_language(tmp_path):
+
+    index = make_wiki(tmp_path)
+
+    assert set(index.query('(abc OR xyz) AND NOT def')) == {'Page 0'}
+    assert set(index.query('abc !(def AND xyz)')) == {'Page 0', 'Page 1'}
+    assert set(index.query('NOT abc')) == {'Page 2'}
+    assert set(index.query('a b AND c')) == set()
+    assert set(index.query('level>2')) == {'Page 2', 'Page 3'}
+    assert set(index.query('level >= 2 &abc')) == {'Page 1', 'Page 3'}
+    assert set(index.query('level<2 OR level=6')) == {'Page 0', 'Page 3'}
+    assert set(index.query('level!=4')) == {'Page 0', 'Page 1', 'Page 3'}
+    assert set(index.query('monster.type=undead')) == {'Page 1', 'Page 3'}
+    assert set(index.query('ns1:abc &ns1:xyz')) == {'Page 3'}
+
+
+def test_tag_index_query_errors(tmp_path):
+
+    index = make_wiki(tmp_path)
+
+    for query in ['(abc', 'abc)', 'abc AND', 'other:abc']:
+        with pytest.raises(QueryError):
+            index.query(query)
@@ -0,0 +1,103 @@
+import yaml
+
+from mokuwiki.wiki import Wiki
+from mokuwiki.fileio import find_files, match_parts, split_pattern
+
+from utils import Markdown
+
+
+def write_page(path, title):
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    Markdown.write(path,
+                   f"""
+                   ---
+                   title: {title}
+                   ...
+                   Some text
+                   """)
+
+
+def make_tree(ns1):
+    write_page(ns1 / 'top.md', 'Top')
+    write_page(ns1 / 'rules' / 'combat.md', 'Combat')
+    write_page(ns1 / 'rules' / 'magic' / 'spells.md', 'Spells')
+    write_page(ns1 / 'rules' / 'drafts' / 'draft.md', 'Draft')
+    write_page(ns1 / 'assets' / 'readme.md', 'Readme')
+    write_page(ns1 / 'assets' / 'deep' / 'more.md', 'More')
+
+
+def test_content_default(tmp_path):
+
+    ns1 = tmp_path / 'source' / 'ns1'
+    make_tree(ns1)
+
+    wiki_config = f"""
+        name: test
+        build_dir: {tmp_path}
+        namespaces:
+          ns1:
+              content: {ns1}
+        """
+
+    wiki = Wiki(yaml.safe_load(wiki_config))
+
+    namespace = wiki.namespaces['ns1']
+    namespace.load_pages()
+
+    # by default only the top level of the content dir is searched
+    assert [p.title for p in namespace.pages] == ['Top']
+    assert list(namespace.dir_scans) == [ns1]
+
+
+def test_content_recursive(tmp_path):
+
+    ns1 = tmp_path / 'source' / 'ns1'
+    make_tree(ns1)
+
+    wiki_config = f"""
+        name: test
+        build_dir: {tmp_path}
+        namespaces:
+          ns1:
+              content: {ns1}
+              content_include: '**/*.md'
+              content_exclude: [assets, '**/drafts']
+        """
+
+    wiki = Wiki(yaml.safe_load(wiki_config))
+
+    namespace = wiki.namespaces['ns1']
+    namespace.load_pages()
+
+    assert sorted(p.title for p in namespace.pages) == ['Combat', 'Spells', 'Top']
+
+    # excluded directories are not searched at all
+    assert set(namespace.dir_scans) == {ns1, ns1 / 'rules', ns1 / 'rules' / 'magic'}
+
+    namespace.process_pages()
+
+    assert (tmp_path / 'ns1' / 'mokuwiki' / 'spells.md').exists()
+
+
+def test_content_patterns(tmp_path):
+
+    ns1 = tmp_path / 'ns1'
+    make_tree(ns1)
+
+    def find(include, exclude=None):
+        return sorted(p.relative_to(ns1).as_posix() for p in find_files(ns1, include, exclude))
+
+    # '*' does not match '/'
+    assert find(['rules/*.md']) == ['rules/combat.md']
+    assert find(['*/*.md']) == ['assets/readme.md', 'rules/combat.md']
+
+    # '**' matches any number of directories, including none
+    assert find(['rules/**/*.md']) == ['rules/combat.md', 'rules/drafts/draft.md', 'rules/magic/spells.md']
+    assert find(['**/d*.md'], ['rules/drafts/*']) == []
+
+    # missing directories have no files
+    assert find_files(tmp_path / 'missing', ['**/*.md']) == []
+
+    assert match_parts(split_pattern('**/drafts/**'), ('rules', 'drafts'))
+    assert not match_parts(split_pattern('drafts'), ('rules', 'drafts'))
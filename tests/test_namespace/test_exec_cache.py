@@ -0,0 +1,195 @@
+import time
+import yaml
+
+from mokuwiki.wiki import Wiki
+
+from utils import Markdown
+
+PROCESS = 'mokuwiki'
+
+
+def make_wiki(tmp_path, exec_cache, command):
+
+    source = tmp_path / 'source'
+    source.mkdir(exist_ok=True)
+
+    ns1 = source / 'ns1'
+    ns1.mkdir(exist_ok=True)
+
+    for i in [1, 2]:
+        Markdown.write(ns1 / f'file{i}.md',
+                       f"""
+                       ---
+                       title: Page {i}
+                       ...
+                       %% {command} %%
+                       """)
+
+    wiki_config = f"""
+        name: test
+        build_dir: {tmp_path}/build
+        exec_cache: {exec_cache}
+        namespaces:
+          ns1:
+              content: {ns1}
+        """
+
+    return Wiki(yaml.safe_load(wiki_config))
+
+
+def read_body(tmp_path, page):
+    actual = tmp_path / 'build' / 'ns1' / PROCESS / page
+    assert actual.exists()
+
+    return actual.read_text().partition('...')[2].strip()
+
+
+def test_exec_cache_build(tmp_path):
+    """Test that an exec directive on two pages runs the command once"""
+
+    counter = tmp_path / 'counter.txt'
+
+    wiki = make_wiki(tmp_path, 'build', f"echo x >> {counter}; wc -l < {counter}")
+    wiki.process_wiki()
+
+    assert counter.read_text() == 'x\n'
+    assert read_body(tmp_path, 'page_1.md') == '1'
+    assert read_body(tmp_path, 'page_2.md') == '1'
+
+
+def test_exec_cache_none(tmp_path):
+    """Test that the cache can be turned off"""
+
+    counter = tmp_path / 'counter.txt'
+
+    wiki = make_wiki(tmp_path, 'none', f"echo x >> {counter}; wc -l < {counter}")
+    wiki.process_wiki()
+
+    assert counter.read_text() == 'x\nx\n'
+
+
+def test_exec_cache_persistent(tmp_path):
+    """Test that outputs are re-used by later builds until a dependency changes"""
+
+    counter = tmp_path / 'counter.txt'
+    data = tmp_path / 'data.txt'
+    data.write_text('one')
+
+    command = f"echo x >> {counter}; cat {data} # depends: {data}"
+
+    make_wiki(tmp_path, 'persistent', command).process_wiki()
+    make_wiki(tmp_path, 'persistent', command).process_wiki()
+
+    assert counter.read_text() == 'x\n'
+    assert read_body(tmp_path, 'page_2.md') == 'one'
+
+    data.write_text('two')
+
+    make_wiki(tmp_path, 'persistent', command).process_wiki()
+
+    assert counter.read_text() == 'x\nx\n'
+    assert read_body(tmp_path, 'page_2.md') == 'two'
+
+
+def test_exec_cache_workers(tmp_path):
+    """Test that commands are run concurrently before pages are processed"""
+
+    source = tmp_path / 'source'
+    source.mkdir()
+
+    ns1 = source / 'ns1'
+    ns1.mkdir()
+
+    for i in range(4):
+        Markdown.write(ns1 / f'file{i}.md',
+                       f"""
+                       ---
+                       title: Page {i}
+                       ...
+                       // %% echo comment {i} %%
+                       %% sleep 0.5; echo page {i} %%
+                       """)
+
+    wiki_config = f"""
+        name: test
+        build_dir: {tmp_path}/build
+        exec_workers: 4
+        exec_timeout: 10
+        namespaces:
+          ns1:
+              content: {ns1}
+        """
+
+    wiki = Wiki(yaml.safe_load(wiki_config))
+
+    start = time.perf_counter()
+    wiki.process_wiki()
+
+    # four commands taking 0.5s each, run at the same time
+    assert time.perf_counter() - start < 1.5
+
+    for i in range(4):
+        assert read_body(tmp_path, f'page_{i}.md') == f'page {i}'
+
+    # commands in comments are not run
+    assert len(wiki.exec_cache._outputs) == 4
+
+
+def test_exec_workers_lazy(tmp_path):
+    """Test that finding the commands before pages are processed does not keep their bodies"""
+
+    source = tmp_path / 'source'
+    source.mkdir()
+
+    ns1 = source / 'ns1'
+    ns1.mkdir()
+
+    for i in range(4):
+        Markdown.write(ns1 / f'file{i}.md',
+                       f"""
+                       ---
+                       title: Page {i}
+                       ...
+                       %% echo page {i} %%
+                       """)
+
+    # large pages are still processed using a memory map
+    for mmap_threshold in [0, 1]:
+        wiki_config = f"""
+            name: test
+            build_dir: {tmp_path}/build
+            exec_workers: 4
+            mmap_threshold: {mmap_threshold}
+            namespaces:
+              ns1:
+                  content: {ns1}
+            """
+
+        wiki = Wiki(yaml.safe_load(wiki_config))
+
+        namespace = wiki.namespaces['ns1']
+        namespace.load_pages()
+
+        wiki.prefetch_exec_commands()
+
+        assert len(wiki.exec_cache._outputs) == 4
+        assert all(page._body is None for page in namespace.pages)
+
+        page = namespace.pages[0]
+        page.process_directives()
+
+        assert (page._segments is not None) == (mmap_threshold > 0)
+        assert page.body.strip() == f"page {page.title[-1]}"
+
+
+def test_exec_timeout(tmp_path):
+    """Test that a command that takes too long is stopped"""
+
+    wiki = make_wiki(tmp_path, 'build', "sleep 5; echo late")
+    wiki.exec_cache.timeout = 0.2
+
+    start = time.perf_counter()
+    wiki.process_wiki()
+
+    assert time.perf_counter() - start < 2
+    assert read_body(tmp_path, 'page_1.md') == ''
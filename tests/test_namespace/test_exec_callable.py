@@ -0,0 +1,74 @@
+import yaml
+
+from mokuwiki.wiki import Wiki
+
+from utils import Markdown
+
+PROCESS = 'mokuwiki'
+
+
+def test_exec_callable(tmp_path, monkeypatch):
+    """Test that a 'py:' exec directive calls a Python function with the
+    rest of the directive and the page's metadata
+    """
+
+    helpers = tmp_path / 'helpers'
+    helpers.mkdir()
+
+    (helpers / 'mw_helpers.py').write_text(
+        "def shout(args, meta):\n"
+        "    return f\"{meta['title'].upper()} {args}!\"\n"
+        "\n"
+        "def broken(args, meta):\n"
+        "    raise RuntimeError('oops')\n")
+
+    monkeypatch.syspath_prepend(str(helpers))
+
+    source = tmp_path / 'source'
+    source.mkdir()
+
+    ns1 = source / 'ns1'
+    ns1.mkdir()
+
+    file1 = ns1 / 'file1.md'
+    Markdown.write(file1,
+                   """
+                   ---
+                   title: Page One
+                   ...
+                   %% py:shout hello there %%
+
+                   [%% py:broken %%]
+
+                   [%% py:missing %%]
+                   """)
+
+    wiki_config = f"""
+        name: test
+        build_dir: {tmp_path}
+        exec_callables:
+            shout: mw_helpers:shout
+            broken: mw_helpers:broken
+        namespaces:
+          ns1:
+              content: {ns1}
+        """
+
+    wiki = Wiki(yaml.safe_load(wiki_config))
+    wiki.process_wiki()
+
+    actual1 = tmp_path / 'ns1' / PROCESS / 'page_one.md'
+    assert actual1.exists()
+
+    expect1 = """
+    ---
+    title: Page One
+    ...
+    PAGE ONE hello there!
+
+    []
+
+    []
+    """
+
+    assert Markdown.compare(expect1, actual1)
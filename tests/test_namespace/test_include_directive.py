@@ -1109,3 +1109,68 @@ def test_file_includes_metadata_replace_multi(tmp_path):
     """
     
     assert Markdown.compare(expect1, actual1)
+
+
+def test_file_includes_scanned(tmp_path):
+
+    source = tmp_path / 'source'
+    source.mkdir()
+
+    ns1 = source / 'ns1'
+    ns1.mkdir()
+
+    inc = ns1 / 'inc'
+    inc.mkdir()
+
+    for n in range(2):
+        Markdown.write(ns1 / f"file{n}.md",
+                       f"""
+                       ---
+                       title: Page {n}
+                       ...
+                       <<inc/part*.md --sort>>
+                       <<later.txt>>
+                       """)
+
+    for n in range(2):
+        Markdown.write(inc / f"part{n}.md", f"Part {n}")
+
+    wiki_config = f"""
+        name: test
+        build_dir: {tmp_path}
+        namespaces:
+          ns1:
+              content: {ns1}
+        """
+
+    wiki = Wiki(yaml.safe_load(wiki_config))
+
+    namespace = wiki.namespaces['ns1']
+    namespace.load_pages()
+
+    # the content directory is scanned once, with the stats of its files
+    assert list(namespace.dir_scans) == [ns1]
+    assert namespace.stat_file(ns1 / 'file0.md').st_size == (ns1 / 'file0.md').stat().st_size
+
+    # files created after the directory was scanned can still be included by name
+    Markdown.write(ns1 / 'later.txt', "Later")
+
+    namespace.process_pages()
+
+    assert set(namespace.dir_scans) == {ns1, inc}
+
+    for n in range(2):
+        expect = f"""
+        ---
+        title: Page {n}
+        ...
+
+        Part 0
+
+        Part 1
+
+
+        Later
+        """
+
+        assert Markdown.compare(expect, tmp_path / 'ns1' / PROCESS / f"page_{n}.md")
@@ -0,0 +1,386 @@
+import yaml
+
+from mokuwiki.wiki import Wiki
+from mokuwiki.page import Page
+from mokuwiki.fileio import FileWriter
+
+from utils import Markdown
+
+PROCESS = 'mokuwiki'
+
+
+def test_page_body_lazy(tmp_path):
+
+    source = tmp_path / 'source'
+    source.mkdir()
+
+    ns1 = source / 'ns1'
+    ns1.mkdir()
+
+    file1 = ns1 / 'file1.md'
+    Markdown.write(file1,
+                   """
+                   ---
+                   title: Page One
+                   tags: [abc]
+                   ...
+                   A link to [[Page Two]]
+                   """)
+
+    file2 = ns1 / 'file2.md'
+    Markdown.write(file2,
+                   """
+                   ---
+                   title: Page Two
+                   tags: [abc]
+                   ...
+                   Some text
+                   """)
+
+    wiki_config = f"""
+        name: test
+        build_dir: {tmp_path}
+        namespaces:
+          ns1:
+              content: {ns1}
+        """
+
+    wiki = Wiki(yaml.safe_load(wiki_config))
+
+    namespace = wiki.namespaces['ns1']
+    namespace.load_pages()
+
+    page = namespace.get_page('Page One')
+
+    # only the metadata is kept after loading
+    assert page._body is None
+    assert page.title == 'Page One'
+
+    # the body is read when needed...
+    assert page.body == 'A link to [[Page Two]]'
+
+    namespace.process_pages()
+
+    # ... and released after the page is saved
+    assert page._body is None
+
+    expect1 = """
+    ---
+    title: Page One
+    tags: [abc]
+    ...
+    A link to [Page Two](page_two.html)
+    """
+
+    assert Markdown.compare(expect1, tmp_path / 'ns1' / PROCESS / 'page_one.md')
+
+    assert not hasattr(page, '__dict__')
+
+
+def test_page_body_single_file(tmp_path):
+
+    file1 = tmp_path / 'file1.md'
+    Markdown.write(file1,
+                   """
+                   ---
+                   title: Page One
+                   ...
+                   Some text
+                   """)
+
+    page = Page(file1, None)
+    page.process_directives()
+    page.release()
+
+    # pages that are not in a namespace keep their body
+    assert page._body == 'Some text'
+
+
+def test_page_stream(tmp_path):
+
+    source = tmp_path / 'source'
+    source.mkdir()
+
+    ns1 = source / 'ns1'
+    ns1.mkdir()
+
+    file1 = ns1 / 'file1.md'
+    Markdown.write(file1,
+                   """
+                   ---
+                   title: Page One
+                   tags: [abc]
+                   foo: bar one
+                   ...
+                   {{abc --format "X ?{foo} X"}}
+                   """)
+
+    file2 = ns1 / 'file2.md'
+    Markdown.write(file2,
+                   """
+                   ---
+                   title: Page Two
+                   tags: [abc]
+                   foo: bar two
+                   ...
+                   {{abc --format "Y ?{foo} Y"}}
+                   """)
+
+    wiki_config = f"""
+        name: test
+        build_dir: {tmp_path}
+        stream: true
+        namespaces:
+          ns1:
+              content: {ns1}
+        """
+
+    wiki = Wiki(yaml.safe_load(wiki_config))
+    wiki.process_wiki()
+
+    # whichever page is saved first, the other can still use all of its metadata
+    expect1 = """
+    ---
+    title: Page One
+    tags: [abc]
+    foo: bar one
+    ...
+    X bar one X
+
+    X bar two X
+
+    """
+
+    assert Markdown.compare(expect1, tmp_path / 'ns1' / PROCESS / 'page_one.md')
+
+    expect2 = """
+    ---
+    title: Page Two
+    tags: [abc]
+    foo: bar two
+    ...
+    Y bar one Y
+
+    Y bar two Y
+
+    """
+
+    assert Markdown.compare(expect2, tmp_path / 'ns1' / PROCESS / 'page_two.md')
+
+    page = wiki.namespaces['ns1'].get_page('Page One')
+
+    # only the metadata used by the index is kept...
+    page.release(wiki.namespaces['ns1'].stream_meta_fields())
+
+    assert page._meta == {'title': 'Page One', 'tags': ['abc']}
+
+    # ... the rest is read again if needed
+    assert page.meta['foo'] == 'bar one'
+
+
+def test_page_front_matter(tmp_path):
+    """Only a line containing '...' ends the metadata, not an ellipsis elsewhere"""
+
+    source = tmp_path / 'source'
+    source.mkdir()
+
+    ns1 = source / 'ns1'
+    ns1.mkdir()
+
+    file1 = ns1 / 'file1.md'
+    Markdown.write(file1,
+                   """
+                   ---
+                   title: Page One
+                   summary: To be continued... later
+                   ...
+                   Wait for it... a link to [[Page One]]
+                   """)
+
+    wiki_config = f"""
+        name: test
+        build_dir: {tmp_path}
+        namespaces:
+          ns1:
+              content: {ns1}
+        """
+
+    wiki = Wiki(yaml.safe_load(wiki_config))
+
+    namespace = wiki.namespaces['ns1']
+    namespace.load_pages()
+
+    page = namespace.get_page('Page One')
+
+    assert page.meta['summary'] == 'To be continued... later'
+    assert page._offset > 0
+    assert page.body == 'Wait for it... a link to [[Page One]]'
+
+    namespace.process_pages()
+
+    expect1 = """
+    ---
+    title: Page One
+    summary: To be continued... later
+    ...
+    Wait for it... a link to [Page One](page_one.html)
+    """
+
+    assert Markdown.compare(expect1, tmp_path / 'ns1' / PROCESS / 'page_one.md')
+
+
+def test_page_mmap(tmp_path):
+    """Large pages are processed a line at a time, copying lines without directives"""
+
+    source = tmp_path / 'source'
+    source.mkdir()
+
+    ns1 = source / 'ns1'
+    ns1.mkdir()
+
+    file1 = ns1 / 'file1.md'
+    Markdown.write(file1,
+                   """
+                   ---
+                   title: Page One
+                   ...
+
+                   Some text
+                   A link to [[Page Two]]
+                   More text... //
+                   with a comment
+                   The end
+
+                   """)
+
+    file2 = ns1 / 'file2.md'
+    Markdown.write(file2,
+                   """
+                   ---
+                   title: Page Two
+                   ...
+                   No directives
+                   """)
+
+    wiki_config = f"""
+        name: test
+        build_dir: {tmp_path}
+        mmap_threshold: 1
+        namespaces:
+          ns1:
+              content: {ns1}
+        """
+
+    wiki = Wiki(yaml.safe_load(wiki_config))
+
+    namespace = wiki.namespaces['ns1']
+    namespace.load_pages()
+
+    page1 = namespace.get_page('Page One')
+    page2 = namespace.get_page('Page Two')
+
+    assert page1.mapped
+
+    page1.process_directives()
+    page2.process_directives()
+
+    # the comment removes the newline after '//', joining the next line
+    assert page1._segments[1] == 'A link to [Page Two](page_two.html)'
+    assert page1._segments[3] == 'More text... '
+    assert isinstance(page1._segments[0], tuple)
+    assert isinstance(page2._segments[0], tuple)
+
+    page1.save()
+    page2.save()
+
+    expect1 = """
+    ---
+    title: Page One
+    ...
+    Some text
+    A link to [Page Two](page_two.html)
+    More text... 
+    The end
+    """
+
+    assert Markdown.compare(expect1, tmp_path / 'ns1' / PROCESS / 'page_one.md')
+
+    expect2 = """
+    ---
+    title: Page Two
+    ...
+    No directives
+    """
+
+    assert Markdown.compare(expect2, tmp_path / 'ns1' / PROCESS / 'page_two.md')
+
+    # the body can still be used as a string
+    assert page1.body == 'Some text\nA link to [Page Two](page_two.html)\nMore text... \nThe end'
+
+    # large pages can be written by a writer's threads as well, even if released before they are written
+    page1.release()
+    page1.process_directives()
+
+    assert page1._segments is not None
+
+    with FileWriter(2) as writer:
+        page1.save(tmp_path / 'page_one_copy.md', writer=writer)
+        page1.release()
+
+    assert Markdown.compare(expect1, tmp_path / 'page_one_copy.md')
+
+
+def test_page_io_workers(tmp_path):
+
+    source = tmp_path / 'source'
+    source.mkdir()
+
+    ns1 = source / 'ns1'
+    ns1.mkdir()
+
+    for n in range(20):
+        Markdown.write(ns1 / f"file{n}.md",
+                       f"""
+                       ---
+                       title: Page {n}
+                       tags: [abc]
+                       ...
+                       A link to [[Page {(n + 1) % 20}]]
+                       """)
+
+    Markdown.write(ns1 / 'bad.md',
+                   """
+                   ---
+                   title: Bad Page
+                   No end to the metadata
+                   """)
+
+    wiki_config = f"""
+        name: test
+        build_dir: {tmp_path}
+        io_workers: 4
+        namespaces:
+          ns1:
+              content: {ns1}
+        """
+
+    wiki = Wiki(yaml.safe_load(wiki_config))
+
+    namespace = wiki.namespaces['ns1']
+    namespace.load_pages()
+
+    # pages are loaded in the same order as without io_workers, and bad pages are skipped
+    assert [p.source for p in namespace.pages] == [p for p in ns1.glob('*.md') if p.name != 'bad.md']
+
+    namespace.process_pages()
+
+    for n in range(20):
+        expect = f"""
+        ---
+        title: Page {n}
+        tags: [abc]
+        ...
+        A link to [Page {(n + 1) % 20}](page_{(n + 1) % 20}.html)
+        """
+
+        assert Markdown.compare(expect, tmp_path / 'ns1' / PROCESS / f"page_{n}.md")
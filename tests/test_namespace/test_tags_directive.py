@@ -1221,3 +1221,291 @@ def test_tags_table(tmp_path):
     
     assert Markdown.compare(expect1, actual1)
 
+
+def test_tags_directive_cache(tmp_path):
+    """Test that identical tag directives on different pages are rendered once
+    and give the same result, ignoring extra whitespace between arguments
+    """
+
+    source = tmp_path / 'source'
+    source.mkdir()
+
+    ns1 = source / 'ns1'
+    ns1.mkdir()
+
+    file1 = ns1 / 'file1.md'
+    Markdown.write(file1,
+                   """
+                   ---
+                   title: Page One
+                   tags: [abc]
+                   ...
+                   {{abc   &def}}
+                   """)
+
+    file2 = ns1 / 'file2.md'
+    Markdown.write(file2,
+                   """
+                   ---
+                   title: Page Two
+                   tags: [abc, def]
+                   ...
+                   {{abc &def}}
+                   """)
+
+    wiki_config = f"""
+        name: test
+        build_dir: {tmp_path}
+        namespaces:
+          ns1:
+              content: {ns1}
+        """
+
+    wiki = Wiki(yaml.safe_load(wiki_config))
+    wiki.process_wiki()
+
+    assert len(wiki.namespaces['ns1'].tags_cache) == 1
+
+    actual1 = tmp_path / 'ns1' / PROCESS / 'page_one.md'
+    assert actual1.exists()
+
+    expect1 = """
+    ---
+    title: Page One
+    tags: [abc]
+    ...
+    [Page Two](page_two.html)
+    """
+
+    assert Markdown.compare(expect1, actual1)
+
+    actual2 = tmp_path / 'ns1' / PROCESS / 'page_two.md'
+    assert actual2.exists()
+
+    expect2 = """
+    ---
+    title: Page Two
+    tags: [abc, def]
+    ...
+    [Page Two](page_two.html)
+    """
+
+    assert Markdown.compare(expect2, actual2)
+
+def test_tags_directive_query(tmp_path):
+    """Test that tag directives support grouping, keywords and metadata comparisons
+    """
+
+    source = tmp_path / 'source'
+    source.mkdir()
+
+    ns1 = source / 'ns1'
+    ns1.mkdir()
+
+    file1 = ns1 / 'file1.md'
+    Markdown.write(file1,
+                   """
+                   ---
+                   title: Page One
+                   tags: [abc]
+                   level: 1
+                   ...
+                   {{(abc OR xyz) AND level>1}}
+
+                   {{#abc &level<3}}
+                   """)
+
+    file2 = ns1 / 'file2.md'
+    Markdown.write(file2,
+                   """
+                   ---
+                   title: Page Two
+                   tags: [abc, def]
+                   level: 2
+                   ...
+                   Text 2
+                   """)
+
+    file3 = ns1 / 'file3.md'
+    Markdown.write(file3,
+                   """
+                   ---
+                   title: Page Three
+                   tags: [xyz]
+                   level: 3
+                   ...
+                   Text 3
+                   """)
+
+    wiki_config = f"""
+        name: test
+        build_dir: {tmp_path}
+        namespaces:
+          ns1:
+              content: {ns1}
+        """
+
+    wiki = Wiki(yaml.safe_load(wiki_config))
+    wiki.process_wiki()
+
+    actual1 = tmp_path / 'ns1' / PROCESS / 'page_one.md'
+    assert actual1.exists()
+
+    expect1 = """
+    ---
+    title: Page One
+    tags: [abc]
+    level: 1
+    ...
+    [Page Three](page_three.html)
+
+    [Page Two](page_two.html)
+
+
+
+    2
+    """
+
+    assert Markdown.compare(expect1, actual1)
+
+def test_tags_directive_missing(tmp_path):
+    """Test that in the original syntax a missing first tag gives no pages, as it always has
+    """
+
+    source = tmp_path / 'source'
+    source.mkdir()
+
+    ns1 = source / 'ns1'
+    ns1.mkdir()
+
+    file1 = ns1 / 'file1.md'
+    Markdown.write(file1,
+                   """
+                   ---
+                   title: Page One
+                   ...
+                   A{{missing def --before=( --after=)}}B
+
+                   C{{def &missing --before=( --after=)}}D
+
+                   {{missing OR def}}
+                   """)
+
+    file2 = ns1 / 'file2.md'
+    Markdown.write(file2,
+                   """
+                   ---
+                   title: Page Two
+                   tags: [def]
+                   ...
+                   Text 2
+                   """)
+
+    wiki_config = f"""
+        name: test
+        build_dir: {tmp_path}
+        namespaces:
+          ns1:
+              content: {ns1}
+        """
+
+    wiki = Wiki(yaml.safe_load(wiki_config))
+    wiki.process_wiki()
+
+    expect1 = """
+    ---
+    title: Page One
+    ...
+    A()B
+
+    CD
+
+
+    [Page Two](page_two.html)
+    """
+
+    assert Markdown.compare(expect1, tmp_path / 'ns1' / PROCESS / 'page_one.md')
+
+
+def test_tags_directive_sort_by(tmp_path):
+    """Test that '--sort-by' orders pages using a metadata field
+    """
+
+    source = tmp_path / 'source'
+    source.mkdir()
+
+    ns1 = source / 'ns1'
+    ns1.mkdir()
+
+    file1 = ns1 / 'file1.md'
+    Markdown.write(file1,
+                   """
+                   ---
+                   title: Page One
+                   tags: [abc]
+                   level: 10
+                   ...
+                   {{abc --sort-by level --format "?{title}:?{level}"}}
+
+                   {{abc level>1 --sort-by level --reverse}}
+                   """)
+
+    file2 = ns1 / 'file2.md'
+    Markdown.write(file2,
+                   """
+                   ---
+                   title: Page Two
+                   tags: [abc]
+                   level: 9
+                   ...
+                   Text 2
+                   """)
+
+    file3 = ns1 / 'file3.md'
+    Markdown.write(file3,
+                   """
+                   ---
+                   title: Page Three
+                   tags: [abc]
+                   ...
+                   Text 3
+                   """)
+
+    wiki_config = f"""
+        name: test
+        build_dir: {tmp_path}
+        namespaces:
+          ns1:
+              content: {ns1}
+              meta_indexes: [level]
+        """
+
+    wiki = Wiki(yaml.safe_load(wiki_config))
+    wiki.process_wiki()
+
+    actual1 = tmp_path / 'ns1' / PROCESS / 'page_one.md'
+    assert actual1.exists()
+
+    # numeric order, pages without the field are last
+    expect1 = """
+    ---
+    title: Page One
+    tags: [abc]
+    level: 10
+    ...
+    Page Two:9
+
+    Page One:10
+
+    Page Three:?{level}
+
+
+
+    [Page One](page_one.html)
+
+    [Page Two](page_two.html)
+
+    [Page Three](page_three.html)
+    """
+
+    assert Markdown.compare(expect1, actual1)
@@ -0,0 +1,49 @@
+import pytest
+import yaml
+
+from mokuwiki.utils import load_simple_yaml, load_yaml
+
+
+def test_load_simple_yaml():
+    source = '---\ntitle: Page One\ntags: [abc, def]\nsummary: Wait for it... x#y\n'
+    actual = load_simple_yaml(source)
+    expect = {'title': 'Page One', 'tags': ['abc', 'def'], 'summary': 'Wait for it... x#y'}
+
+    assert actual == expect
+    assert actual == yaml.safe_load(source)
+
+
+def test_load_simple_yaml_not_simple():
+    """Anything that YAML might load differently is left to the parser"""
+
+    sources = ['title: yes', 'level: 3', 'date: 2024-01-01', 'title: ~', "title: 'quoted'",
+               'title: A: B', 'title: x # comment', 'tags: [1, a]', 'tags:\n- abc',
+               'title: Page\n  continued', 'null: x', '---', 'tags: [a?]', 'tags: [a?b, c]', 'tags: [a:b]',
+               'tags: [a#b]', 'tags: [a-b]', 'summary:  ', 'tags:   ', 'title: Page\nsummary:  ']
+
+    for source in sources:
+        assert load_simple_yaml(source) is None
+
+
+def test_load_yaml_loaders():
+    source = '---\ntitle: Page One\nlevel: 3\ntags: [abc]\nmonster:\n  type: undead\n'
+    expect = yaml.safe_load(source)
+
+    for loader in ['fast', 'c', 'python']:
+        assert load_yaml(source, loader) == expect
+
+
+def test_load_yaml_fast_fallback():
+    """Lists with indicators are loaded by the parser, e.g. libyaml accepts '[a?]' but the Python parser does not"""
+
+    for source in ['tags: [a?]', 'tags: [a-b, c]', 'summary:  ']:
+        try:
+            expect = load_yaml(source, 'c')
+        except yaml.YAMLError:
+            with pytest.raises(yaml.YAMLError):
+                load_yaml(source, 'fast')
+        else:
+            assert load_yaml(source, 'fast') == expect
+
+    with pytest.raises(yaml.YAMLError):
+        load_yaml('tags: [a?]', 'python')
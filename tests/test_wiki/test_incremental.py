@@ -0,0 +1,152 @@
+import json
+
+from utils import Markdown, build_written
+
+PROCESS = 'mokuwiki'
+
+
+def test_incremental(tmp_path):
+
+    source = tmp_path / 'source'
+    source.mkdir()
+
+    ns1 = source / 'ns1'
+    ns1.mkdir()
+
+    Markdown.write(ns1 / 'file1.md',
+                   """
+                   ---
+                   title: Page One
+                   ...
+                   A link to [[Page Two]]
+                   """)
+
+    Markdown.write(ns1 / 'file2.md',
+                   """
+                   ---
+                   title: Page Two
+                   ...
+                   Some text
+                   """)
+
+    Markdown.write(ns1 / 'file3.md',
+                   """
+                   ---
+                   title: Page Three
+                   ...
+                   <<part.txt>>
+                   """)
+
+    Markdown.write(ns1 / 'part.txt', "Included text")
+
+    wiki_config = f"""
+        name: test
+        build_dir: {tmp_path / 'build'}
+        incremental: true
+        namespaces:
+          ns1:
+              content: {ns1}
+        """
+
+    assert build_written(wiki_config, tmp_path / 'build') == {'Page One', 'Page Two', 'Page Three'}
+    assert (tmp_path / 'build' / '_manifest.json').exists()
+
+    manifest = json.loads((tmp_path / 'build' / '_manifest.json').read_text(encoding='utf8'))
+
+    assert set(manifest['pages']) == {'ns1/0/file1.md', 'ns1/0/file2.md', 'ns1/0/file3.md'}
+    assert manifest['pages']['ns1/0/file3.md']['dependent']
+    assert not manifest['pages']['ns1/0/file1.md']['dependent']
+
+    # pages with include (or exec) directives are always rendered
+    assert build_written(wiki_config, tmp_path / 'build') == {'Page Three'}
+
+    # files are compared by their contents, not their modification times
+    for path in ns1.iterdir():
+        path.touch()
+
+    assert build_written(wiki_config, tmp_path / 'build') == {'Page Three'}
+
+    # a change to the body of a page only renders that page
+    Markdown.write(ns1 / 'file2.md',
+                   """
+                   ---
+                   title: Page Two
+                   ...
+                   Some other text
+                   """)
+
+    assert build_written(wiki_config, tmp_path / 'build') == {'Page Two', 'Page Three'}
+
+    # missing output is rendered again
+    (tmp_path / 'build' / 'ns1' / PROCESS / 'page_one.md').unlink()
+
+    assert build_written(wiki_config, tmp_path / 'build') == {'Page One', 'Page Three'}
+
+    # a change to the metadata of any page renders every page, as links and tags may change
+    Markdown.write(ns1 / 'file2.md',
+                   """
+                   ---
+                   title: Page Two
+                   tags: [abc]
+                   ...
+                   Some other text
+                   """)
+
+    assert build_written(wiki_config, tmp_path / 'build') == {'Page One', 'Page Two', 'Page Three'}
+
+    expect1 = """
+    ---
+    title: Page One
+    ...
+    A link to [Page Two](page_two.html)
+    """
+
+    assert Markdown.compare(expect1, tmp_path / 'build' / 'ns1' / PROCESS / 'page_one.md')
+
+    # a change to an option only renders the pages that use it, e.g. only pages with links use broken_css
+    wiki_config = wiki_config.replace('name: test', 'name: test\n        broken_css: .missing')
+
+    assert build_written(wiki_config, tmp_path / 'build') == {'Page One', 'Page Three'}
+
+    # search options only change the search index
+    wiki_config = wiki_config.replace('name: test', 'name: test\n        search_prefix: "var index = "')
+
+    assert build_written(wiki_config, tmp_path / 'build') == {'Page Three'}
+    assert (tmp_path / 'build' / 'ns1' / PROCESS / '_index.json').read_text(encoding='utf8').startswith('var index = ')
+
+    # and some options do not change the output at all
+    wiki_config = wiki_config.replace('name: test', 'name: test\n        io_workers: 2')
+
+    assert build_written(wiki_config, tmp_path / 'build') == {'Page Three'}
+
+    # other options render every page
+    wiki_config = wiki_config.replace('name: test', 'name: test\n        meta_links: [see]')
+
+    assert build_written(wiki_config, tmp_path / 'build') == {'Page One', 'Page Two', 'Page Three'}
+
+
+def test_incremental_off(tmp_path):
+
+    ns1 = tmp_path / 'source' / 'ns1'
+    ns1.mkdir(parents=True)
+
+    Markdown.write(ns1 / 'file1.md',
+                   """
+                   ---
+                   title: Page One
+                   ...
+                   Some text
+                   """)
+
+    wiki_config = f"""
+        name: test
+        build_dir: {tmp_path / 'build'}
+        namespaces:
+          ns1:
+              content: {ns1}
+        """
+
+    assert build_written(wiki_config, tmp_path / 'build') == {'Page One'}
+    assert build_written(wiki_config, tmp_path / 'build') == {'Page One'}
+
+    assert not (tmp_path / 'build' / '_manifest.json').exists()
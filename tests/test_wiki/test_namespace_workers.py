@@ -0,0 +1,125 @@
+import yaml
+
+import mokuwiki.wiki
+from mokuwiki.wiki import Wiki, _process_namespace, _read_namespace
+
+from utils import Markdown, build_wiki
+
+PROCESS = 'mokuwiki'
+
+
+def test_namespace_workers(tmp_path):
+
+    source = tmp_path / 'source'
+
+    for n in range(1, 4):
+        ns = source / f"ns{n}"
+        ns.mkdir(parents=True)
+
+        Markdown.write(ns / 'file1.md',
+                       f"""
+                       ---
+                       title: Page One {n}
+                       tags: [tag{n}]
+                       ...
+                       Links to [[ns1:Page One 1]], [[ns{n % 3 + 1}:Page Two {n % 3 + 1}]] and [[ns{n}:Missing {n}]]
+                       """)
+
+        Markdown.write(ns / 'file2.md',
+                       f"""
+                       ---
+                       title: Page Two {n}
+                       tags: [tag{n}]
+                       ...
+                       {{{{tag{n}}}}}
+                       """)
+
+    wiki_config = f"""
+        name: test
+        search_merged_file: search.json
+        namespaces:
+          ns1:
+              content: {source / 'ns1'}
+          ns2:
+              content: {source / 'ns2'}
+          ns3:
+              content: {source / 'ns3'}
+        """
+
+    serial = build_wiki(wiki_config, profile=True, build_dir=str(tmp_path / 'serial'), namespace_workers=0)
+    parallel = build_wiki(wiki_config, profile=True, build_dir=str(tmp_path / 'parallel'), namespace_workers=2)
+
+    files = sorted(p.relative_to(tmp_path / 'serial') for p in (tmp_path / 'serial').rglob('*') if p.is_file())
+
+    assert len(files) > 6
+
+    for file in files:
+        assert (tmp_path / 'parallel' / file).read_text() == (tmp_path / 'serial' / file).read_text()
+
+    expect = """
+    ---
+    tags:
+    - tag2
+    title: Page One 2
+    ...
+    Links to [Page One 1](../ns1/page_one_1.html), [Page Two 3](../ns3/page_two_3.html) and [Missing 2]{.broken}
+    """
+
+    assert Markdown.compare(expect, tmp_path / 'parallel' / 'ns2' / PROCESS / 'page_one_2.md')
+
+    # the broken links and timings found by the worker processes are kept
+    for name, namespace in parallel.namespaces.items():
+        assert namespace.index.get_broken() == serial.namespaces[name].index.get_broken() == {f"Missing {name[-1]}"}
+
+    report, serial_report = parallel.profiler.report(), serial.profiler.report()
+
+    assert set(report['pages']) == set(serial_report['pages'])
+    assert {n: set(p) for n, p in report['phases'].items()} == {n: set(p) for n, p in serial_report['phases'].items()}
+
+
+def test_namespace_workers_tasks(tmp_path):
+    """A worker process returns only what it did in each task, even if it has done other tasks"""
+
+    source = tmp_path / 'source'
+
+    for n in range(1, 3):
+        ns = source / f"ns{n}"
+        ns.mkdir(parents=True)
+
+        Markdown.write(ns / 'file1.md',
+                       f"""
+                       ---
+                       title: Page {n}
+                       ...
+                       A link to [[ns1:Missing {n}]]
+                       """)
+
+    wiki_config = f"""
+        name: test
+        build_dir: {tmp_path / 'build'}
+        incremental: true
+        namespaces:
+          ns1:
+              content: {source / 'ns1'}
+          ns2:
+              content: {source / 'ns2'}
+        """
+
+    wiki = Wiki(yaml.safe_load(wiki_config))
+
+    # run the tasks in this process, as a worker would
+    mokuwiki.wiki._wiki = wiki
+
+    try:
+        for name in wiki.namespaces:
+            result = _read_namespace(name)
+
+            assert set(result['files']) == {f"{name}/0/file1.md"}
+
+            for page in result['pages']:
+                wiki.namespaces[name].index_page(page)
+
+        assert _process_namespace('ns1')['broken'] == {'ns1': {'Missing 1'}, 'ns2': set()}
+        assert _process_namespace('ns2')['broken'] == {'ns1': {'Missing 2'}, 'ns2': set()}
+    finally:
+        mokuwiki.wiki._wiki = None
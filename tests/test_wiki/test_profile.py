@@ -0,0 +1,120 @@
+import json
+import yaml
+
+from mokuwiki.wiki import Wiki, mokuwiki
+
+from utils import Markdown
+
+
+def make_wiki_config(tmp_path):
+
+    source = tmp_path / 'source'
+    source.mkdir()
+
+    ns1 = source / 'ns1'
+    ns1.mkdir()
+
+    file1 = ns1 / 'file1.md'
+    Markdown.write(file1,
+                   """
+                   ---
+                   title: Page One
+                   tags: [abc]
+                   ...
+                   A link to [[Page Two]] and a tag list {{abc}}
+
+                   // a comment
+                   """)
+
+    file2 = ns1 / 'file2.md'
+    Markdown.write(file2,
+                   """
+                   ---
+                   title: Page Two
+                   tags: [abc]
+                   ...
+                   A link to [[Page One]]
+                   """)
+
+    return f"""
+        name: test
+        build_dir: {tmp_path}
+        namespaces:
+          ns1:
+              content: {ns1}
+              search_fields: ['title']
+        """
+
+
+def test_profile_report(tmp_path):
+
+    wiki = Wiki(yaml.safe_load(make_wiki_config(tmp_path)), profile=True)
+    wiki.process_wiki()
+
+    report = wiki.profiler.report()
+
+    phases = report['phases']['ns1']
+
+    for phase in ['preprocess', 'load', 'index', 'render', 'save', 'search', 'postprocess']:
+        assert phase in phases
+        assert phases[phase]['wall'] >= 0
+
+    assert phases['load']['count'] == 2
+    assert phases['render']['count'] == 2
+
+    assert report['directives']['link']['count'] == 2
+    assert report['directives']['tags']['count'] == 1
+    assert report['directives']['comment']['count'] == 1
+
+    assert 'render' in wiki.profiler.summary()
+
+
+def test_profile_disabled(tmp_path):
+
+    wiki = Wiki(yaml.safe_load(make_wiki_config(tmp_path)))
+    wiki.process_wiki()
+
+    assert not wiki.profiler.phases
+    assert not wiki.profiler.directives
+
+
+def test_profile_option(tmp_path, capsys):
+
+    config = tmp_path / 'wiki.yaml'
+    config.write_text(make_wiki_config(tmp_path), encoding='utf8')
+
+    profile = tmp_path / 'profile.json'
+
+    mokuwiki([str(config), '--profile', str(profile)])
+
+    with profile.open('r', encoding='utf8') as fh:
+        report = json.load(fh)
+
+    assert report['phases']['ns1']['render']['count'] == 2
+    assert 'directive' in capsys.readouterr().out
+
+
+def test_profile_slowest_pages(tmp_path):
+
+    wiki = Wiki(yaml.safe_load(make_wiki_config(tmp_path)), profile=True)
+    wiki.process_wiki()
+
+    slowest = wiki.profiler.slowest_pages(1)
+
+    assert len(slowest) == 1
+
+    report = wiki.profiler.report()['pages']
+
+    page_one = report[str(tmp_path / 'source' / 'ns1' / 'file1.md')]
+
+    assert page_one['namespace'] == 'ns1'
+    assert page_one['directives']['tags']['count'] == 1
+    assert page_one['directives']['link']['count'] == 1
+    assert page_one['slowest_directive']['directive']
+
+    page_two = report[str(tmp_path / 'source' / 'ns1' / 'file2.md')]
+
+    assert 'tags' not in page_two['directives']
+
+    assert 'slowest pages:' in wiki.profiler.summary(slowest=2)
+    assert 'slowest pages:' not in wiki.profiler.summary(slowest=0)
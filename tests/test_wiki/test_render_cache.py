@@ -0,0 +1,201 @@
+from utils import Markdown, build_written
+
+PROCESS = 'mokuwiki'
+
+
+def test_render_cache(tmp_path):
+
+    source = tmp_path / 'source'
+    source.mkdir()
+
+    ns1 = source / 'ns1'
+    ns1.mkdir()
+
+    inc = ns1 / 'inc'
+    inc.mkdir()
+
+    Markdown.write(ns1 / 'file1.md',
+                   """
+                   ---
+                   title: Page One
+                   ...
+                   A link to [[Page Two]]
+                   """)
+
+    Markdown.write(ns1 / 'file2.md',
+                   """
+                   ---
+                   title: Page Two
+                   ...
+                   <<inc/part*.txt --sort>>
+                   """)
+
+    Markdown.write(ns1 / 'file3.md',
+                   """
+                   ---
+                   title: Page Three
+                   ...
+                   %% echo Hello %%
+                   """)
+
+    Markdown.write(inc / 'part1.txt', "Part one")
+
+    wiki_config = f"""
+        name: test
+        build_dir: {tmp_path / 'build'}
+        render_cache_dir: {tmp_path / 'cache'}
+        clean: setup
+        namespaces:
+          ns1:
+              content: {ns1}
+        """
+
+    assert build_written(wiki_config, tmp_path / 'cache') == {'Page One', 'Page Two'}
+
+    # the build dir is removed, but the pages are in the cache, so none are stored again (pages
+    # with exec directives are rendered every time and never stored)
+    assert build_written(wiki_config, tmp_path / 'cache') == set()
+
+    expect2 = """
+    ---
+    title: Page Two
+    ...
+    Part one
+    """
+
+    assert Markdown.compare(expect2, tmp_path / 'build' / 'ns1' / PROCESS / 'page_two.md')
+    assert (tmp_path / 'build' / 'ns1' / PROCESS / 'page_one.md').exists()
+
+    expect3 = """
+    ---
+    title: Page Three
+    ...
+    Hello
+    """
+
+    assert Markdown.compare(expect3, tmp_path / 'build' / 'ns1' / PROCESS / 'page_three.md')
+
+    # a change to an included file...
+    Markdown.write(inc / 'part1.txt', "Part one again")
+
+    assert build_written(wiki_config, tmp_path / 'cache') == {'Page Two'}
+
+    # ... or a new file matching the include renders the page again
+    Markdown.write(inc / 'part2.txt', "Part two")
+
+    assert build_written(wiki_config, tmp_path / 'cache') == {'Page Two'}
+
+    expect2 = """
+    ---
+    title: Page Two
+    ...
+    Part one again
+
+    Part two
+    """
+
+    assert Markdown.compare(expect2, tmp_path / 'build' / 'ns1' / PROCESS / 'page_two.md')
+
+    # a change to the metadata of any page renders every page
+    Markdown.write(ns1 / 'file1.md',
+                   """
+                   ---
+                   title: Page One
+                   tags: [abc]
+                   ...
+                   A link to [[Page Two]]
+                   """)
+
+    assert build_written(wiki_config, tmp_path / 'cache') == {'Page One', 'Page Two'}
+    assert build_written(wiki_config, tmp_path / 'cache') == set()
+
+
+def test_render_cache_stages(tmp_path):
+
+    ns1 = tmp_path / 'source' / 'ns1'
+    ns1.mkdir(parents=True)
+
+    Markdown.write(ns1 / 'file1.md',
+                   """
+                   ---
+                   title: Page One
+                   ...
+                   <<part.txt>>
+                   """)
+
+    Markdown.write(ns1 / 'file2.md',
+                   """
+                   ---
+                   title: Page Two
+                   ...
+                   Some text
+                   """)
+
+    # directives in included files are processed by the including page
+    Markdown.write(ns1 / 'part.txt', "A link to [[Page Three]]")
+
+    wiki_config = f"""
+        name: test
+        build_dir: {tmp_path / 'build'}
+        render_cache_dir: {tmp_path / 'cache'}
+        clean: setup
+        namespaces:
+          ns1:
+              content: {ns1}
+        """
+
+    assert build_written(wiki_config, tmp_path / 'cache') == {'Page One', 'Page Two'}
+    assert build_written(wiki_config, tmp_path / 'cache') == set()
+
+    # the included file has a link, so the page depends on the options for links
+    wiki_config = wiki_config.replace('name: test', 'name: test\n        broken_css: .missing')
+
+    assert build_written(wiki_config, tmp_path / 'cache') == {'Page One'}
+
+    expect1 = """
+    ---
+    title: Page One
+    ...
+    A link to [Page Three]{.missing}
+    """
+
+    assert Markdown.compare(expect1, tmp_path / 'build' / 'ns1' / PROCESS / 'page_one.md')
+
+    assert build_written(wiki_config.replace('name: test', 'name: test\n        search_fields: [title]'), tmp_path / 'cache') == set()
+
+
+def test_render_cache_mapped(tmp_path):
+    """Pages large enough to be memory mapped are not cached"""
+
+    ns1 = tmp_path / 'source' / 'ns1'
+    ns1.mkdir(parents=True)
+
+    Markdown.write(ns1 / 'file1.md',
+                   """
+                   ---
+                   title: Page One
+                   ...
+                   A link to [[Page Two]]
+                   """)
+
+    Markdown.write(ns1 / 'file2.md',
+                   """
+                   ---
+                   title: Page Two
+                   ...
+                   """ + "Some text\n" * 20)
+
+    wiki_config = f"""
+        name: test
+        build_dir: {tmp_path / 'build'}
+        render_cache_dir: {tmp_path / 'cache'}
+        clean: setup
+        mmap_threshold: 100
+        namespaces:
+          ns1:
+              content: {ns1}
+        """
+
+    assert build_written(wiki_config, tmp_path / 'cache') == {'Page One'}
+    assert build_written(wiki_config, tmp_path / 'cache') == set()
+    assert (tmp_path / 'build' / 'ns1' / PROCESS / 'page_two.md').exists()